@@ -24,6 +24,7 @@ from app.models.models import (
     IngredientDelivery,
     AlertType,
     Alert,
+    RealtimeEvent,
 )
 from app.core.config import settings
 
@@ -86,7 +87,12 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite cannot ALTER most things in place; batch mode copies tables
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
 
         with context.begin_transaction():
             context.run_migrations()
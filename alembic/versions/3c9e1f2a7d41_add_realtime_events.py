@@ -0,0 +1,43 @@
+"""Add realtime_events
+
+Revision ID: 3c9e1f2a7d41
+Revises: b4fa759847a5
+Create Date: 2026-10-19 10:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e1f2a7d41"
+down_revision: Union[str, None] = "b4fa759847a5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "realtime_events",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_realtime_events_id"), "realtime_events", ["id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_realtime_events_id"), table_name="realtime_events")
+    op.drop_table("realtime_events")
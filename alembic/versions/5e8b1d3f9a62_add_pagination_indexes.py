@@ -0,0 +1,43 @@
+"""Add indexes for keyset pagination
+
+Revision ID: 5e8b1d3f9a62
+Revises: 7a2d5e9c4b18
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8b1d3f9a62"
+down_revision: Union[str, None] = "7a2d5e9c4b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_meal_servings_meal_id_id", "meal_servings", ["meal_id", "id"])
+    op.create_index(
+        "ix_meal_servings_served_by_id", "meal_servings", ["served_by", "id"]
+    )
+    op.create_index(
+        "ix_ingredient_deliveries_ingredient_id_id",
+        "ingredient_deliveries",
+        ["ingredient_id", "id"],
+    )
+    op.create_index("ix_alerts_is_read_id", "alerts", ["is_read", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_alerts_is_read_id", table_name="alerts")
+    op.drop_index(
+        "ix_ingredient_deliveries_ingredient_id_id",
+        table_name="ingredient_deliveries",
+    )
+    op.drop_index("ix_meal_servings_served_by_id", table_name="meal_servings")
+    op.drop_index("ix_meal_servings_meal_id_id", table_name="meal_servings")
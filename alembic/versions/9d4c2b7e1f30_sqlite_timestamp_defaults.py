@@ -0,0 +1,59 @@
+"""Use CURRENT_TIMESTAMP defaults on SQLite
+
+The initial migration gives timestamp columns a now() default, which
+SQLite does not have: inserts that rely on it fail. PostgreSQL is left
+unchanged.
+
+Revision ID: 9d4c2b7e1f30
+Revises: 5e8b1d3f9a62
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4c2b7e1f30"
+down_revision: Union[str, None] = "5e8b1d3f9a62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columns the initial migration created with server_default now()
+TIMESTAMP_COLUMNS = {
+    "ingredients": ("created_at", "updated_at"),
+    "monthly_reports": ("created_at", "updated_at"),
+    "roles": ("created_at", "updated_at"),
+    "users": ("created_at",),
+    "alerts": ("created_at",),
+    "ingredient_deliveries": ("created_at",),
+    "meals": ("created_at", "updated_at"),
+    "meal_ingredients": ("created_at", "updated_at"),
+    "meal_servings": ("served_at", "created_at"),
+}
+
+
+def _set_defaults(default: str) -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(
+                    column,
+                    existing_type=sa.DateTime(timezone=True),
+                    existing_nullable=True,
+                    server_default=sa.text(default),
+                )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _set_defaults("CURRENT_TIMESTAMP")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _set_defaults("now()")
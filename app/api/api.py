@@ -1,10 +1,12 @@
 from typing import List
 from fastapi import APIRouter
 
+from app.api.endpoints.dashboard import router as dashboard_router
 from app.api.endpoints.ingredients import router as ingredients_router
 from app.api.endpoints.meals import router as meals_router
 from app.api.endpoints.meal_servings import router as meal_servings_router
 from app.api.endpoints.reports import router as reports_router
+from app.api.endpoints.system import router as system_router
 from app.api.endpoints.users import router as users_router
 from app.api.endpoints.websocket import router as websocket_router
 
@@ -18,4 +20,6 @@ api_router.include_router(
 )
 api_router.include_router(reports_router, prefix="/reports", tags=["reports"])
 api_router.include_router(users_router, prefix="/users", tags=["users"])
+api_router.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
+api_router.include_router(system_router, prefix="/system", tags=["system"])
 api_router.include_router(websocket_router, prefix="/ws", tags=["websocket"])
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.events import RecordsChanged, bus
+from app.models.models import Alert, Ingredient, Meal, MealIngredient
+
+# Tables whose changes make the snapshot stale
+SNAPSHOT_TABLES = frozenset(
+    {
+        Ingredient.__tablename__,
+        Meal.__tablename__,
+        MealIngredient.__tablename__,
+        Alert.__tablename__,
+    }
+)
+
+
+def build_snapshot(db: Session) -> Dict[str, Any]:
+    """Everything the kitchen dashboard shows, read in four queries"""
+    ingredients = db.query(Ingredient).order_by(Ingredient.id).all()
+    meals = db.query(Meal).order_by(Meal.id).all()
+    meal_ingredients = db.query(MealIngredient).all()
+    unread_alerts = (
+        db.query(Alert.alert_type, func.count(Alert.id))
+        .filter(Alert.is_read == False)
+        .group_by(Alert.alert_type)
+        .all()
+    )
+
+    stock = {ingredient.id: ingredient.quantity for ingredient in ingredients}
+    portions: Dict[int, Optional[int]] = {meal.id: None for meal in meals}
+    for meal_ingredient in meal_ingredients:
+        available = stock.get(meal_ingredient.ingredient_id, 0)
+        if available <= 0 or meal_ingredient.quantity <= 0:
+            max_portions = 0
+        else:
+            max_portions = int(available / meal_ingredient.quantity)
+        current = portions.get(meal_ingredient.meal_id)
+        if current is None or max_portions < current:
+            portions[meal_ingredient.meal_id] = max_portions
+
+    unread_by_type = {
+        getattr(alert_type, "value", alert_type): count
+        for alert_type, count in unread_alerts
+    }
+    return {
+        "ingredients": [
+            {
+                "id": ingredient.id,
+                "name": ingredient.name,
+                "quantity": ingredient.quantity,
+                "min_quantity": ingredient.min_quantity,
+            }
+            for ingredient in ingredients
+        ],
+        "meals": [
+            {
+                "id": meal.id,
+                "name": meal.name,
+                "available_portions": portions[meal.id] or 0,
+            }
+            for meal in meals
+        ],
+        "low_stock": [
+            {
+                "id": ingredient.id,
+                "name": ingredient.name,
+                "quantity": ingredient.quantity,
+                "min_quantity": ingredient.min_quantity,
+            }
+            for ingredient in ingredients
+            if ingredient.quantity < ingredient.min_quantity
+        ],
+        "unread_alerts": {
+            "total": sum(unread_by_type.values()),
+            "by_type": unread_by_type,
+        },
+    }
+
+
+class DashboardSnapshot:
+    """
+    The dashboard payload, serialized once and reused until data changes.
+
+    Commits touching ingredients, meals or alerts mark the snapshot stale
+    through the event bus; the next request rebuilds it. Changes made by
+    other workers are picked up after DASHBOARD_SNAPSHOT_MAX_AGE seconds.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        # (body, etag), swapped as one so readers never mix two versions
+        self.payload: Optional[Tuple[bytes, str]] = None
+        self.rebuilds = 0
+        self._built_at = 0.0
+        self._generation = 0
+        self._built_generation = -1
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+
+    async def on_records_changed(self, event: RecordsChanged) -> None:
+        if event.tables & SNAPSHOT_TABLES:
+            self.invalidate()
+
+    def is_fresh(self) -> bool:
+        if self.payload is None or self._built_generation != self._generation:
+            return False
+        return self.max_age <= 0 or time.monotonic() - self._built_at < self.max_age
+
+    def get(self, db: Session) -> Tuple[bytes, str]:
+        """The current payload and its ETag, rebuilt first if stale"""
+        if not self.is_fresh():
+            with self._lock:
+                # Concurrent requests wait for a single rebuild
+                if not self.is_fresh():
+                    self._rebuild(db)
+        return self.payload
+
+    def _rebuild(self, db: Session) -> None:
+        generation = self._generation
+        body = json.dumps(build_snapshot(db), separators=(",", ":")).encode()
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.payload = (body, f'"{digest}"')
+        self._built_at = time.monotonic()
+        self._built_generation = generation
+        self.rebuilds += 1
+
+
+snapshot = DashboardSnapshot(settings.DASHBOARD_SNAPSHOT_MAX_AGE)
+bus.subscribe(RecordsChanged, snapshot.on_records_changed)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates: List[str] = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
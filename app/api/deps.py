@@ -1,16 +1,28 @@
-from typing import Generator, Optional
+import logging
+from typing import AsyncGenerator, Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.crud import crud_user as crud
 from app.schemas.meal_serving import TokenPayload
 from app.models import models
 from app.core import security
+from app.core.auth_cache import UserPrincipal, auth_cache
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.db.replica import USER_KEY, replica_router
+from app.db.session import (
+    AsyncSessionLocal,
+    LazySession,
+    ReplicaSessionLocal,
+    SessionLocal,
+)
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -18,43 +30,126 @@ oauth2_scheme = OAuth2PasswordBearer(
 
 
 def get_db() -> Generator:
+    """
+    Session for the request. It is created, and a connection checked out,
+    only when the request first uses it.
+    """
+    db = LazySession(SessionLocal)
     try:
-        db = SessionLocal()
         yield db
     finally:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _token_user_id(token: str) -> int:
+    user_id = auth_cache.get_token(token)
+    if user_id is None:
+        try:
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+            )
+            token_data = TokenPayload(**payload)
+        except (JWTError, ValidationError):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+        user_id = token_data.sub
+        auth_cache.put_token(token, user_id, payload.get("exp"))
+    return user_id
+
+
+def _remember(user: Optional[models.User]) -> UserPrincipal:
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    principal = UserPrincipal.from_user(user)
+    auth_cache.put_principal(principal)
+    return principal
+
+
 def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> models.User:
+) -> UserPrincipal:
+    """
+    The user a bearer token belongs to. Tokens and principals are served
+    from auth_cache, so most requests neither decode the JWT nor query users.
+    """
+    user_id = _token_user_id(token)
+    auth_cache.check_version(db)
+    principal = auth_cache.get_principal(user_id)
+    if principal is None:
+        principal = _remember(crud.user.get(db, id=user_id))
+    # Lets read-only requests of this user stay on the primary after a write
+    db.info[USER_KEY] = principal.id
+    return principal
+
+
+def _replica_or_primary() -> Session:
+    """
+    A replica session with a connection checked out, or a primary session
+    when the replica cannot be reached, so the read does not fail
+    """
+    db = ReplicaSessionLocal()
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-    except (JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    user = crud.user.get(db, id=token_data.sub)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+        db.connection()
+    except OperationalError as e:
+        db.close()
+        logger.warning(f"Read replica unavailable, using the primary: {e}")
+        replica_router.mark_unavailable()
+        replica_router.fallbacks += 1
+        return SessionLocal()
+    return db
+
+
+def get_read_db(
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> Generator:
+    """
+    Session for read-only endpoints: the read replica when one is configured,
+    healthy and current enough for this user, otherwise the primary. A
+    replica that turns out to be down when the session is first used is
+    swapped for the primary.
+    """
+    on_replica = replica_router.use_replica(current_user.id)
+    db = LazySession(_replica_or_primary if on_replica else SessionLocal)
+    try:
+        yield db
+    except OperationalError:
+        if on_replica:
+            replica_router.mark_unavailable()
+        raise
+    finally:
+        db.close()
+
+
+async def aget_current_user(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> UserPrincipal:
+    """get_current_user for async endpoints"""
+    user_id = _token_user_id(token)
+    await auth_cache.acheck_version(db)
+    principal = auth_cache.get_principal(user_id)
+    if principal is None:
+        principal = _remember(await crud.user.aget(db, id=user_id))
+    return principal
 
 
 def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> UserPrincipal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
 def get_current_active_user_with_permission(
-    current_user: models.User = Depends(get_current_active_user),
-) -> models.User:
+    current_user: UserPrincipal = Depends(get_current_active_user),
+) -> UserPrincipal:
     if current_user.role not in [models.UserRole.admin, models.UserRole.manager]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -64,8 +159,8 @@ def get_current_active_user_with_permission(
 
 
 def get_current_active_admin(
-    current_user: models.User = Depends(get_current_active_user),
-) -> models.User:
+    current_user: UserPrincipal = Depends(get_current_active_user),
+) -> UserPrincipal:
     if current_user.role != models.UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
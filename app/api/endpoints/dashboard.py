@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Response
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.api.dashboard_snapshot import etag_matches, snapshot
+from app.core.auth_cache import UserPrincipal
+
+router = APIRouter()
+
+
+@router.get("/snapshot")
+def read_dashboard_snapshot(
+    db: Session = Depends(deps.get_db),
+    if_none_match: Optional[str] = Header(default=None),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
+):
+    """
+    Get stock, meal availability, low-stock items and unread alert counts
+    in one response. Send the ETag back in If-None-Match to get 304 when
+    nothing changed.
+    """
+    body, etag = snapshot.get(db)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,27 +1,38 @@
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.models import models
+from app.core.auth_cache import UserPrincipal
 from app.crud import crud_ingredient as crud
 from app.schemas import ingredient as schemas
 from app.api import deps
+from app.api.pagination import Pagination
+from app.api.serialization import RowSerializer
+from app.core.config import settings
 
 router = APIRouter()
 
+ingredient_rows = RowSerializer(schemas.Ingredient)
+delivery_rows = RowSerializer(schemas.IngredientDelivery)
+
 
 @router.get("/", response_model=List[schemas.Ingredient])
 def read_ingredients(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_user),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Retrieve ingredients.
     """
-    ingredients = crud.ingredient.get_multi(db, skip=skip, limit=limit)
-    return ingredients
+    ingredients = crud.ingredient.get_multi(
+        db, skip=page.skip, limit=page.limit, after=page.after
+    )
+    page.set_next_cursor(response, ingredients)
+    return ingredient_rows.response(ingredients, response)
 
 
 @router.post("/", response_model=schemas.Ingredient)
@@ -29,7 +40,7 @@ def create_ingredient(
     *,
     db: Session = Depends(deps.get_db),
     ingredient_in: schemas.IngredientCreate,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Create new ingredient.
@@ -44,21 +55,90 @@ def create_ingredient(
     return ingredient
 
 
+@router.post("/bulk", response_model=List[schemas.Ingredient])
+def create_ingredients(
+    *,
+    db: Session = Depends(deps.get_db),
+    ingredients_in: List[schemas.IngredientCreate] = Body(
+        ..., min_length=1, max_length=settings.BULK_MAX_ITEMS
+    ),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
+):
+    """
+    Create many ingredients in one transaction.
+    """
+    names = [ingredient_in.name for ingredient_in in ingredients_in]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Ingredient names must be unique")
+    existing = crud.ingredient.get_many_by_name(db, names=names)
+    if existing:
+        raise HTTPException(
+            status_code=400,
+            detail="Ingredients with these names already exist: "
+            + ", ".join(ingredient.name for ingredient in existing),
+        )
+    try:
+        return crud.ingredient.create_many(db, objs_in=ingredients_in)
+    except IntegrityError:
+        # Another request created one of the names since the check above
+        raise HTTPException(status_code=400, detail="Ingredient names must be unique")
+
+
+@router.patch("/bulk", response_model=List[schemas.Ingredient])
+def update_ingredients(
+    *,
+    db: Session = Depends(deps.get_db),
+    ingredients_in: List[schemas.IngredientBulkUpdate] = Body(
+        ..., min_length=1, max_length=settings.BULK_MAX_ITEMS
+    ),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
+):
+    """
+    Update many ingredients by id in one transaction; fields left out are
+    kept.
+    """
+    try:
+        return crud.ingredient.update_many(db, objs_in=ingredients_in)
+    except StaleDataError:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Ingredient names must be unique")
+
+
+@router.put("/bulk", response_model=List[schemas.Ingredient])
+def upsert_ingredients(
+    *,
+    db: Session = Depends(deps.get_db),
+    ingredients_in: List[schemas.IngredientCreate] = Body(
+        ..., min_length=1, max_length=settings.BULK_MAX_ITEMS
+    ),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
+):
+    """
+    Create ingredients, or update the quantities of those whose name exists.
+    """
+    try:
+        return crud.ingredient.upsert_many(db, objs_in=ingredients_in)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=409, detail="Ingredients were changed concurrently, retry"
+        )
+
+
 @router.put("/{id}", response_model=schemas.Ingredient)
 def update_ingredient(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
     ingredient_in: schemas.IngredientUpdate,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Update an ingredient.
     """
-    ingredient = crud.ingredient.get(db, id=id)
+    ingredient = crud.ingredient.update_by_id(db, id=id, obj_in=ingredient_in)
     if not ingredient:
         raise HTTPException(status_code=404, detail="Ingredient not found")
-    ingredient = crud.ingredient.update(db, db_obj=ingredient, obj_in=ingredient_in)
     return ingredient
 
 
@@ -67,7 +147,7 @@ def read_ingredient(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get ingredient by ID.
@@ -83,7 +163,7 @@ def delete_ingredient(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Delete an ingredient.
@@ -100,7 +180,7 @@ def create_ingredient_delivery(
     *,
     db: Session = Depends(deps.get_db),
     delivery_in: schemas.IngredientDeliveryCreate,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Create new ingredient delivery.
@@ -115,18 +195,48 @@ def create_ingredient_delivery(
     return delivery
 
 
+@router.post("/delivery/bulk", response_model=List[schemas.IngredientDelivery])
+def create_ingredient_deliveries(
+    *,
+    db: Session = Depends(deps.get_db),
+    deliveries_in: List[schemas.IngredientDeliveryCreate] = Body(
+        ..., min_length=1, max_length=settings.BULK_MAX_ITEMS
+    ),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
+):
+    """
+    Record many ingredient deliveries in one transaction.
+    """
+    ingredient_ids = {delivery_in.ingredient_id for delivery_in in deliveries_in}
+    found = {
+        ingredient.id for ingredient in crud.ingredient.get_many(db, ids=ingredient_ids)
+    }
+    missing = sorted(ingredient_ids - found)
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ingredients not found: {', '.join(map(str, missing))}",
+        )
+    return crud.ingredient_delivery.create_many_with_user(
+        db, objs_in=deliveries_in, user_id=current_user.id
+    )
+
+
 @router.get("/delivery/", response_model=List[schemas.IngredientDelivery])
 def read_ingredient_deliveries(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_user),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Retrieve ingredient deliveries.
     """
-    deliveries = crud.ingredient_delivery.get_multi(db, skip=skip, limit=limit)
-    return deliveries
+    deliveries = crud.ingredient_delivery.get_multi(
+        db, skip=page.skip, limit=page.limit, after=page.after
+    )
+    page.set_next_cursor(response, deliveries)
+    return delivery_rows.response(deliveries, response)
 
 
 @router.get("/delivery/{id}", response_model=schemas.IngredientDelivery)
@@ -134,7 +244,7 @@ def read_ingredient_delivery(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get ingredient delivery by ID.
@@ -147,8 +257,8 @@ def read_ingredient_delivery(
 
 @router.get("/check-low-stock/", response_model=List[schemas.Ingredient])
 def check_low_stock(
-    db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_user),
+    db: Session = Depends(deps.get_read_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Check for ingredients with low stock.
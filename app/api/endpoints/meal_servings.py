@@ -1,27 +1,34 @@
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
-from app.models import models
+from app.core.auth_cache import UserPrincipal
 from app.schemas import meal_serving as meal_serving_schema
 from app.crud import crud_meal_serving, crud_meal
 from app.api import deps
+from app.api.pagination import Pagination
+from app.api.serialization import RowSerializer
 
 router = APIRouter()
 
+meal_serving_rows = RowSerializer(meal_serving_schema.MealServing)
+
 
 @router.get("/", response_model=List[meal_serving_schema.MealServing])
 def read_meal_servings(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_user),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Retrieve meal servings.
     """
-    meal_servings = crud_meal_serving.meal_serving.get_multi(db, skip=skip, limit=limit)
-    return meal_servings
+    meal_servings = crud_meal_serving.meal_serving.get_multi(
+        db, skip=page.skip, limit=page.limit, after=page.after
+    )
+    page.set_next_cursor(response, meal_servings)
+    return meal_serving_rows.response(meal_servings, response)
 
 
 @router.post("/", response_model=meal_serving_schema.MealServing)
@@ -29,7 +36,7 @@ def create_meal_serving(
     *,
     db: Session = Depends(deps.get_db),
     meal_serving_in: meal_serving_schema.MealServingCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user),
 ):
     """
     Create new meal serving (serve a meal).
@@ -72,7 +79,7 @@ def read_meal_serving(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get meal serving by ID.
@@ -86,37 +93,39 @@ def read_meal_serving(
 @router.get("/by-meal/{meal_id}", response_model=List[meal_serving_schema.MealServing])
 def read_meal_servings_by_meal(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     meal_id: int,
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_user),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get meal servings by meal ID.
     """
     meal_servings = crud_meal_serving.meal_serving.get_by_meal(
-        db, meal_id=meal_id, skip=skip, limit=limit
+        db, meal_id=meal_id, skip=page.skip, limit=page.limit, after=page.after
     )
-    return meal_servings
+    page.set_next_cursor(response, meal_servings)
+    return meal_serving_rows.response(meal_servings, response)
 
 
 @router.get("/by-user/{user_id}", response_model=List[meal_serving_schema.MealServing])
 def read_meal_servings_by_user(
     *,
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     user_id: int,
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Get meal servings by user ID.
     """
     meal_servings = crud_meal_serving.meal_serving.get_by_user(
-        db, user_id=user_id, skip=skip, limit=limit
+        db, user_id=user_id, skip=page.skip, limit=page.limit, after=page.after
     )
-    return meal_servings
+    page.set_next_cursor(response, meal_servings)
+    return meal_serving_rows.response(meal_servings, response)
 
 
 @router.get(
@@ -127,7 +136,7 @@ def calculate_available_portions(
     *,
     db: Session = Depends(deps.get_db),
     meal_id: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Calculate how many portions of a meal can be made with available ingredients.
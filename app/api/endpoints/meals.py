@@ -1,27 +1,37 @@
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 from app.schemas import ingredient as schemas
-from app.models import models
+from app.core.auth_cache import UserPrincipal
 from app.crud import crud_meal, crud_ingredient
 from app.api import deps
+from app.api.pagination import Pagination
+from app.api.serialization import RowSerializer
+from app.core.config import settings
 
 router = APIRouter()
 
+meal_rows = RowSerializer(schemas.Meal)
+
 
 @router.get("/", response_model=List[schemas.Meal])
 def read_meals(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_user),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Retrieve meals.
     """
-    meals = crud_meal.meal.get_multi(db, skip=skip, limit=limit)
-    return meals
+    meals = crud_meal.meal.get_multi(
+        db, skip=page.skip, limit=page.limit, after=page.after
+    )
+    page.set_next_cursor(response, meals)
+    return meal_rows.response(meals, response)
 
 
 @router.post("/", response_model=schemas.Meal)
@@ -29,7 +39,7 @@ def create_meal(
     *,
     db: Session = Depends(deps.get_db),
     meal_in: schemas.MealCreate,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Create new meal with ingredients.
@@ -58,17 +68,88 @@ def create_meal(
     return meal
 
 
+@router.post("/bulk", response_model=List[schemas.Meal])
+def create_meals(
+    *,
+    db: Session = Depends(deps.get_db),
+    meals_in: List[schemas.MealCreate] = Body(
+        ..., min_length=1, max_length=settings.BULK_MAX_ITEMS
+    ),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
+):
+    """
+    Create many meals with their ingredients in one transaction.
+    """
+    names = [meal_in.name for meal_in in meals_in]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Meal names must be unique")
+    existing = crud_meal.meal.get_many_by_name(db, names=names)
+    if existing:
+        raise HTTPException(
+            status_code=400,
+            detail="Meals with these names already exist: "
+            + ", ".join(meal.name for meal in existing),
+        )
+
+    ingredient_ids = {
+        ingredient_item.ingredient_id
+        for meal_in in meals_in
+        for ingredient_item in meal_in.ingredients
+    }
+    found = {
+        ingredient.id
+        for ingredient in crud_ingredient.ingredient.get_many(db, ids=ingredient_ids)
+    }
+    missing = sorted(ingredient_ids - found)
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ingredients not found: {', '.join(map(str, missing))}",
+        )
+
+    return crud_meal.meal.create_many_with_ingredients(
+        db, objs_in=meals_in, user_id=current_user.id
+    )
+
+
+@router.patch("/bulk", response_model=List[schemas.Meal])
+def update_meals(
+    *,
+    db: Session = Depends(deps.get_db),
+    meals_in: List[schemas.MealBulkUpdate] = Body(
+        ..., min_length=1, max_length=settings.BULK_MAX_ITEMS
+    ),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
+):
+    """
+    Rename or describe many meals by id in one transaction.
+    """
+    try:
+        return crud_meal.meal.update_many(db, objs_in=meals_in)
+    except StaleDataError:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Meal names must be unique")
+
+
 @router.put("/{id}", response_model=schemas.Meal)
 def update_meal(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
     meal_in: schemas.MealUpdate,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Update a meal.
     """
+    if meal_in.ingredients is None:
+        # Only name or description: a single UPDATE ... RETURNING
+        meal = crud_meal.meal.update_by_id(db, id=id, obj_in=meal_in)
+        if not meal:
+            raise HTTPException(status_code=404, detail="Meal not found")
+        return meal
+
     meal = crud_meal.meal.get(db, id=id)
     if not meal:
         raise HTTPException(status_code=404, detail="Meal not found")
@@ -94,7 +175,7 @@ def read_meal(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get meal by ID.
@@ -110,7 +191,7 @@ def delete_meal(
     *,
     db: Session = Depends(deps.get_db),
     id: int,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Delete a meal.
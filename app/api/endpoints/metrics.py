@@ -0,0 +1,123 @@
+import secrets
+from typing import Any, Dict, Iterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.api.websockets import manager
+from app.core.access_log import access_log
+from app.core.config import settings
+from app.core.events import bus
+from app.core.metrics import Family, registry
+from app.db.session import pool_stats
+
+router = APIRouter()
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+POOL_GAUGES = ("size", "checked_out", "checked_in", "overflow")
+POOL_COUNTERS = (
+    "checkouts_total",
+    "waits_total",
+    "wait_seconds_total",
+    "timeouts_total",
+)
+
+
+@registry.collector
+def collect_pools() -> Iterator[Family]:
+    stats = pool_stats()
+    pools: Dict[str, Optional[Dict[str, Any]]] = {
+        "primary": stats,
+        "replica": stats["replica_pool"],
+        "async": stats["async_pool"],
+    }
+    for key in POOL_GAUGES + POOL_COUNTERS:
+        samples = [
+            ({"pool": name}, pool[key])
+            for name, pool in pools.items()
+            if pool is not None and key in pool
+        ]
+        yield (
+            f"db_pool_{key}",
+            "counter" if key in POOL_COUNTERS else "gauge",
+            f"Database connection pool {key.replace('_', ' ')}",
+            samples,
+        )
+
+
+@registry.collector
+def collect_websockets() -> Iterator[Family]:
+    stats = manager.stats()
+    yield (
+        "websocket_connections",
+        "gauge",
+        "Open WebSocket connections by role",
+        [
+            ({"role": role}, count)
+            for role, count in stats["connections_by_role"].items()
+        ],
+    )
+    yield (
+        "websocket_messages_dropped_total",
+        "counter",
+        "WebSocket messages dropped from full send queues",
+        [({}, stats["dropped_total"])],
+    )
+
+
+@registry.collector
+def collect_event_bus() -> Iterator[Family]:
+    stats = bus.stats()
+    yield (
+        "event_bus_pending",
+        "gauge",
+        "Events waiting for dispatch",
+        [({}, stats["pending"])],
+    )
+    yield (
+        "event_bus_dropped_total",
+        "counter",
+        "Events dropped because the queue was full",
+        [({}, stats["dropped_total"])],
+    )
+
+
+@registry.collector
+def collect_access_log() -> Iterator[Family]:
+    yield (
+        "access_log_dropped_total",
+        "counter",
+        "Access log lines dropped because the queue was full",
+        [({}, access_log.stats()["dropped_total"])],
+    )
+
+
+def authorize_scrape(
+    db: Session = Depends(deps.get_db), token: str = Depends(deps.oauth2_scheme)
+) -> None:
+    """METRICS_TOKEN when it is set, otherwise an admin's access token"""
+    if settings.METRICS_TOKEN:
+        if not secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+        return
+    deps.get_current_active_admin(
+        deps.get_current_active_user(deps.get_current_user(db=db, token=token))
+    )
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+    dependencies=[Depends(authorize_scrape)],
+)
+def read_metrics():
+    """Metrics of this worker process in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -1,9 +1,9 @@
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from datetime import date, datetime
 
-from app.models import models
+from app.core.auth_cache import UserPrincipal
 from app.crud import crud_reports, crud_ingredient, crud_meal
 from app.schemas.reports import (
     MonthlyReport,
@@ -13,6 +13,7 @@ from app.schemas.reports import (
     Alert,
 )
 from app.api import deps
+from app.api.pagination import Pagination
 
 router = APIRouter()
 
@@ -23,7 +24,7 @@ def get_monthly_report(
     db: Session = Depends(deps.get_db),
     year: int,
     month: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get monthly report by year and month.
@@ -43,7 +44,7 @@ def generate_monthly_report(
     db: Session = Depends(deps.get_db),
     year: int,
     month: int,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Generate or update monthly report for specified month and year.
@@ -60,7 +61,7 @@ def get_monthly_report_detailed(
     db: Session = Depends(deps.get_db),
     year: int,
     month: int,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get detailed monthly report data including meal and ingredient statistics.
@@ -74,11 +75,11 @@ def get_monthly_report_detailed(
 @router.get("/ingredient/{ingredient_id}/usage", response_model=IngredientUsageData)
 def get_ingredient_usage(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     ingredient_id: int,
     start_date: date,
     end_date: date = None,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get usage data for a specific ingredient in a date range.
@@ -99,11 +100,11 @@ def get_ingredient_usage(
 @router.get("/meal/{meal_id}/servings", response_model=MealServingData)
 def get_meal_servings(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     meal_id: int,
     start_date: date,
     end_date: date = None,
-    current_user: models.User = Depends(deps.get_current_user),
+    current_user: UserPrincipal = Depends(deps.get_current_user),
 ):
     """
     Get serving data for a specific meal in a date range.
@@ -123,23 +124,22 @@ def get_meal_servings(
 
 @router.get("/alerts/", response_model=List[Alert])
 def get_alerts(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
+    page: Pagination = Depends(),
     unread_only: bool = False,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
 
     if unread_only:
-        alerts = (
-            db.query(models.Alert)
-            .filter(models.Alert.is_read == False)
-            .offset(skip)
-            .limit(limit)
-            .all()
+        alerts = crud_reports.alert.get_unread(
+            db, skip=page.skip, limit=page.limit, after=page.after
         )
     else:
-        alerts = db.query(models.Alert).offset(skip).limit(limit).all()
+        alerts = crud_reports.alert.get_multi(
+            db, skip=page.skip, limit=page.limit, after=page.after
+        )
+    page.set_next_cursor(response, alerts)
     return alerts
 
 
@@ -148,17 +148,12 @@ def mark_alert_read(
     *,
     db: Session = Depends(deps.get_db),
     alert_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user_with_permission),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user_with_permission),
 ):
     """
     Mark an alert as read.
     """
-    alert = db.query(models.Alert).filter(models.Alert.id == alert_id).first()
+    alert = crud_reports.alert.mark_read(db, id=alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
-
-    alert.is_read = True
-    db.add(alert)
-    db.commit()
-    db.refresh(alert)
     return alert
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+
+from app.api import deps
+from app.db.replica import replica_router
+from app.db.session import pool_stats, session_metrics
+from app.core.auth_cache import UserPrincipal
+
+router = APIRouter()
+
+
+@router.get("/db-pool")
+def read_db_pool_stats(
+    current_user: UserPrincipal = Depends(deps.get_current_active_admin),
+):
+    """
+    Get database connection pool usage (checked-out connections, waits,
+    overflow and timeouts), read replica routing and how many request
+    sessions were never used by this worker.
+    """
+    return {
+        **pool_stats(),
+        "replica_routing": replica_router.stats(),
+        "sessions": session_metrics.stats(),
+    }
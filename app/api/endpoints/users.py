@@ -1,28 +1,32 @@
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Body
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app.models import models
+from app.core.auth_cache import UserPrincipal
 from app.schemas.meal_serving import Token
 from app.schemas.user import User, UserCreate, UserUpdate
 from app.crud import crud_user
 from app.api import deps
+from app.api.pagination import Pagination
 from app.core import security
+from app.core.password_hasher import password_hasher
 from app.core.config import settings
 
 router = APIRouter()
 
 
 @router.post("/login/access-token", response_model=Token)
-def login_access_token(
+async def login_access_token(
     db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud_user.user.authenticate(
+    user = await crud_user.user.aauthenticate(
         db, username=form_data.username, password=form_data.password
     )
     if not user:
@@ -40,7 +44,7 @@ def login_access_token(
 
 @router.get("/users/me", response_model=User)
 def read_users_me(
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user),
 ):
     """
     Get current user.
@@ -50,62 +54,66 @@ def read_users_me(
 
 @router.get("/users/", response_model=List[User])
 def read_users(
-    db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
+    page: Pagination = Depends(),
+    current_user: UserPrincipal = Depends(deps.get_current_active_admin),
 ):
     """
     Retrieve users.
     """
-    users = crud_user.user.get_multi(db, skip=skip, limit=limit)
+    users = crud_user.user.get_multi(
+        db, skip=page.skip, limit=page.limit, after=page.after
+    )
+    page.set_next_cursor(response, users)
     return users
 
 
 @router.post("/users/", response_model=User)
-def create_user(
+async def create_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: UserCreate,
-    # current_user: models.User = Depends(deps.get_current_active_admin),
+    # current_user: UserPrincipal = Depends(deps.get_current_active_admin),
 ):
     """
     Create new user.
     """
-    user = crud_user.user.get_by_email(db, email=user_in.email)
+    user = await run_in_threadpool(crud_user.user.get_by_email, db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
-    user = crud_user.user.get_by_username(db, username=user_in.username)
+    user = await run_in_threadpool(
+        crud_user.user.get_by_username, db, username=user_in.username
+    )
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system",
         )
-    user = crud_user.user.create(db, obj_in=user_in)
+    user = await crud_user.user.acreate(db, obj_in=user_in)
     return user
 
 
 @router.put("/users/{user_id}", response_model=User)
-def update_user(
+async def update_user(
     *,
     db: Session = Depends(deps.get_db),
     user_id: int,
     user_in: UserUpdate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: UserPrincipal = Depends(deps.get_current_active_admin),
 ):
     """
     Update a user.
     """
-    user = crud_user.user.get(db, id=user_id)
+    user = await crud_user.user.aupdate_by_id(db, id=user_id, obj_in=user_in)
     if not user:
         raise HTTPException(
             status_code=404,
             detail="The user with this ID does not exist in the system",
         )
-    user = crud_user.user.update(db, db_obj=user, obj_in=user_in)
     return user
 
 
@@ -114,7 +122,7 @@ def read_user(
     *,
     db: Session = Depends(deps.get_db),
     user_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: UserPrincipal = Depends(deps.get_current_active_user),
 ):
     """
     Get user by ID.
@@ -131,3 +139,13 @@ def read_user(
             detail="The user doesn't have enough privileges",
         )
     return user
+
+
+@router.get("/password-hasher/stats")
+def read_password_hasher_stats(
+    current_user: UserPrincipal = Depends(deps.get_current_active_admin),
+):
+    """
+    Get password hashing pool metrics (queue depth, waits, rejections).
+    """
+    return password_hasher.stats()
@@ -4,6 +4,9 @@ from sqlalchemy.orm import Session
 
 from app.api import deps
 from app.api.websockets import manager
+from app.api.ws_encoding import negotiate_encoding
+from app.db.session import AsyncSessionLocal
+from app.core.auth_cache import UserPrincipal
 from app.models.models import UserRole
 
 router = APIRouter()
@@ -14,55 +17,86 @@ async def websocket_endpoint(
     websocket: WebSocket,
     client_id: str,
     token: Optional[str] = None,
+    encoding: Optional[str] = None,
+    batch: bool = False,
 ):
     """
     WebSocket endpoint for real-time updates.
+
+    New connections are subscribed to the default topics and their role
+    channel. Clients narrow or widen that with JSON commands, e.g.
+    {"action": "subscribe", "topics": ["ingredient:3", "meal:1"]} or
+    {"action": "unsubscribe", "topics": ["ingredients"]}.
+
+    Every event carries a sequence number. After a reconnect a client sends
+    {"action": "resume", "epoch": ..., "last_seq": ...} to receive only the
+    events it missed, or is told to reload a snapshot.
+
+    With WS_PING_INTERVAL and WS_PONG_TIMEOUT set, the server sends
+    {"type": "ping"} periodically; clients answer with {"action": "pong"} or
+    any other command, otherwise the connection is closed.
+
+    Stock changes arrive as one inventory_update or low_stock_alert message
+    per ingredient. Clients that connect with ?batch=true get them as
+    inventory_batch and low_stock_batch frames instead, one per
+    WS_BATCH_INTERVAL tick with every ingredient that changed.
+
+    Messages are JSON text by default. Clients on slow links can ask for
+    MessagePack binary frames with ?encoding=msgpack or the
+    "kitchen.msgpack" subprotocol.
     """
     # Default role for unauthenticated connections
     role = "guest"
+    user_id = None
 
     # Validate token if provided
     if token:
         try:
-            # Get database session
-            db = next(deps.get_db())
-
-            # Validate token and get user
-            from jose import jwt, JWTError
-            from app.core.security import ALGORITHM
-            from app.core.config import settings
-
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-                user_id = int(payload.get("sub"))
-                if user_id:
-                    user = (
-                        db.query(deps.models.User)
-                        .filter(deps.models.User.id == user_id)
-                        .first()
-                    )
-                    if user and user.is_active:
-                        role = user.role
-            except (JWTError, ValueError):
-                pass
-
+            async with AsyncSessionLocal() as db:
+                principal = await deps.aget_current_user(db=db, token=token)
+            if principal.is_active:
+                role = principal.role
+                user_id = principal.id
         except Exception:
             pass
 
-    # Accept connection
-    await manager.connect(websocket, client_id, role)
+    # Accept the connection unless the IP or user is at its connection cap
+    ip = websocket.client.host if websocket.client else None
+    encoding, subprotocol = negotiate_encoding(websocket, encoding)
+    connection = await manager.connect(
+        websocket,
+        client_id,
+        role,
+        encoding=encoding,
+        subprotocol=subprotocol,
+        ip=ip,
+        user_id=user_id,
+        batched=batch,
+    )
+    if connection is None:
+        return
 
     try:
         # Send initial connection confirmation
         await manager.send_personal_message(
-            f"Connected to real-time updates. Role: {role}", websocket
+            f"Connected to real-time updates. Role: {role}. Encoding: {encoding}",
+            websocket,
         )
 
-        # Keep connection open and handle messages
+        # Keep connection open and handle subscription commands
         while True:
             data = await websocket.receive_text()
-            # Process any client messages if needed
-            await manager.send_personal_message(f"Message received", websocket)
+            await manager.handle_message(websocket, data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+
+
+@router.get("/stats")
+def read_websocket_stats(
+    current_user: UserPrincipal = Depends(deps.get_current_active_admin),
+):
+    """
+    Get WebSocket fan-out metrics (queue depth, drops, disconnects).
+    """
+    return manager.stats()
@@ -0,0 +1,49 @@
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+class Pagination:
+    """
+    Page parameters of list endpoints, ordered by id.
+
+    Pass the X-Next-Cursor header of a response as cursor to get the page
+    after it; this stays fast however deep the page is. skip and limit keep
+    working as before and skip is applied after the cursor.
+    """
+
+    def __init__(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ):
+        self.skip = skip
+        self.limit = limit
+        self.after = decode_cursor(cursor) if cursor else None
+
+    def set_next_cursor(self, response: Response, items: List[Any]) -> None:
+        """Point to the next page, unless this one was the last"""
+        if items and len(items) >= self.limit:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
@@ -1,57 +1,1020 @@
-from typing import List, Dict, Any, Optional
+from typing import (
+    List,
+    Dict,
+    Any,
+    Callable,
+    Optional,
+    Deque,
+    Iterable,
+    Iterator,
+    Set,
+    Union,
+)
+from collections import deque
 from fastapi import WebSocket, WebSocketDisconnect, Depends
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 import json
 import asyncio
+import enum
+import functools
+import logging
+import time
 from datetime import datetime
 
-from app.db.session import SessionLocal
+from app.api.ws_encoding import ENCODING_JSON, Frame
+from app.api.ws_event_log import EventLog
+from app.core.backplane import PostgresBackplane, create_backplane
+from app.core.config import settings
+from app.core.events import MealServed, StockChanged, bus
+from app.crud.crud_meal_serving import meal_serving
+from app.db.session import AsyncSessionLocal
 from app.models.models import Ingredient, Alert, AlertType
 
+logger = logging.getLogger(__name__)
+
+# Messages are either pre-rendered text or a payload encoded per client
+Message = Union[str, Dict[str, Any]]
+
+# Topics a client can subscribe to. Ingredient and meal topics also come in a
+# per-object form ("ingredient:12", "meal:3"); role channels are "role:<role>".
+TOPIC_INGREDIENTS = "ingredients"
+TOPIC_MEALS = "meals"
+TOPIC_ALERTS = "alerts"
+GLOBAL_TOPICS = {TOPIC_INGREDIENTS, TOPIC_MEALS, TOPIC_ALERTS}
+
+
+def ingredient_topic(ingredient_id: int) -> str:
+    return f"ingredient:{ingredient_id}"
+
+
+def meal_topic(meal_id: int) -> str:
+    return f"meal:{meal_id}"
+
+
+def role_topic(role: str) -> str:
+    return f"role:{role}"
+
+
+def is_valid_topic(topic: str, role: str) -> bool:
+    """Check a topic name; role channels are limited to the client's own role"""
+    if topic in GLOBAL_TOPICS:
+        return True
+    prefix, _, value = topic.partition(":")
+    if prefix in ("ingredient", "meal"):
+        return value.isdigit()
+    if prefix == "role":
+        return value == role
+    return False
+
+
+class OverflowPolicy(str, enum.Enum):
+    drop_oldest = "drop_oldest"
+    coalesce = "coalesce"
+    disconnect = "disconnect"
+
+
+class FanoutMetrics:
+    """Cumulative counters for the WebSocket fan-out"""
+
+    __slots__ = (
+        "sent",
+        "dropped",
+        "coalesced",
+        "slow_disconnects",
+        "send_errors",
+        "reaped_pong_timeout",
+        "reaped_idle",
+        "rejected",
+    )
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.send_errors = 0
+        self.reaped_pong_timeout = 0
+        self.reaped_idle = 0
+        self.rejected = 0
+
+
+class ClientConnection:
+    """
+    A connected client with its own bounded outbound queue.
+
+    Messages are queued by the broadcaster and written to the socket by a
+    dedicated sender task, so a slow client never blocks the others.
+    """
+
+    __slots__ = (
+        "websocket",
+        "client_id",
+        "role",
+        "metrics",
+        "max_queue",
+        "policy",
+        "send_timeout",
+        "queue",
+        "pending",
+        "topics",
+        "encoding",
+        "batched",
+        "ip",
+        "user_id",
+        "last_seen",
+        "last_ping",
+        "ping_pending",
+        "close_code",
+        "closed",
+        "_wakeup",
+        "_sending",
+        "_task",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        role: str,
+        *,
+        metrics: FanoutMetrics,
+        max_queue: int,
+        policy: OverflowPolicy,
+        send_timeout: float,
+        encoding: str = ENCODING_JSON,
+        batched: bool = False,
+        ip: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.role = role
+        self.metrics = metrics
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        # Queue entries are [coalesce_key, message] so they can be replaced in place
+        self.queue: Deque[list] = deque()
+        self.pending: Dict[str, list] = {}
+        self.topics: Set[str] = set()
+        self.encoding = encoding
+        # Wants inventory_batch/low_stock_batch frames rather than one
+        # message per ingredient
+        self.batched = batched
+        self.ip = ip
+        self.user_id = user_id
+        # Heartbeat state, in time.monotonic() seconds
+        self.last_seen = time.monotonic()
+        self.last_ping = self.last_seen
+        self.ping_pending = False
+        # 1013: try again later
+        self.close_code = 1013
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._sending = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def start(self, on_close) -> None:
+        self._task = asyncio.create_task(self._sender(on_close))
+
+    def enqueue(self, message: Union[str, Frame], key: Optional[str] = None) -> bool:
+        """
+        Queue a message for this client without waiting for the socket.
+
+        Frames are encoded in the client's negotiated encoding when they are
+        sent; plain strings always go out as text.
+
+        With the coalesce policy a message carrying a key replaces a still
+        pending message with the same key. Returns False if the message was
+        not queued.
+        """
+        if self.closed:
+            return False
+
+        if key is not None and self.policy == OverflowPolicy.coalesce:
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry[1] = message
+                self.metrics.coalesced += 1
+                return True
+
+        if len(self.queue) >= self.max_queue:
+            if self.policy == OverflowPolicy.disconnect:
+                self.metrics.dropped += 1
+                self.metrics.slow_disconnects += 1
+                self.close()
+                return False
+            oldest = self.queue.popleft()
+            self._forget(oldest)
+            self.metrics.dropped += 1
+
+        entry = [key, message]
+        self.queue.append(entry)
+        if key is not None:
+            self.pending[key] = entry
+        self._wakeup.set()
+        return True
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.pending.clear()
+        # Wake the sender so it exits and closes the socket; a send that is
+        # stuck on a slow client is interrupted
+        self._wakeup.set()
+        if self._sending and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def wait_closed(self) -> None:
+        """Wait until the sender has finished and closed the socket"""
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _forget(self, entry: list) -> None:
+        key = entry[0]
+        if key is not None and self.pending.get(key) is entry:
+            del self.pending[key]
+
+    async def _sender(self, on_close) -> None:
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                entry = self.queue.popleft()
+                self._forget(entry)
+                message = entry[1]
+                if isinstance(message, Frame):
+                    message = message.encode(self.encoding)
+                if isinstance(message, bytes):
+                    send = self.websocket.send_bytes(message)
+                else:
+                    send = self.websocket.send_text(message)
+                self._sending = True
+                try:
+                    await asyncio.wait_for(send, timeout=self.send_timeout)
+                finally:
+                    self._sending = False
+                self.metrics.sent += 1
+                # wait_for drops a cancellation that arrives as the send
+                # completes; without this the loop would wait forever
+                if asyncio.current_task().cancelling():
+                    raise asyncio.CancelledError
+        except Exception as e:
+            self.metrics.send_errors += 1
+            logger.info(f"Dropping WebSocket client {self.client_id}: {e!r}")
+        finally:
+            self.close()
+            on_close(self)
+            try:
+                await self.websocket.close(code=self.close_code)
+            except Exception:
+                pass
+
+
+class ConnectionRegistry:
+    """
+    Active connections indexed by socket, role, client_id and topic.
+
+    Role, client and topic indexes map to insertion-ordered dicts used as
+    sets, so adding and removing a connection is O(1) and the members of a
+    role or topic can be iterated directly. A client_id may have several
+    sockets open.
+    """
 
-class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[Dict[str, Any]] = []
+        self.by_socket: Dict[WebSocket, ClientConnection] = {}
+        self.by_role: Dict[str, Dict[ClientConnection, None]] = {}
+        self.by_client: Dict[str, Dict[ClientConnection, None]] = {}
+        self.by_topic: Dict[str, Dict[ClientConnection, None]] = {}
+        self.by_ip: Dict[str, Dict[ClientConnection, None]] = {}
+        self.by_user: Dict[int, Dict[ClientConnection, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self.by_socket)
+
+    def __iter__(self) -> Iterator[ClientConnection]:
+        return iter(list(self.by_socket.values()))
 
-    async def connect(self, websocket: WebSocket, client_id: str, role: str):
-        await websocket.accept()
-        self.active_connections.append(
-            {"websocket": websocket, "client_id": client_id, "role": role}
+    def add(self, connection: ClientConnection) -> None:
+        self.by_socket[connection.websocket] = connection
+        self.by_role.setdefault(connection.role, {})[connection] = None
+        self.by_client.setdefault(connection.client_id, {})[connection] = None
+        if connection.ip is not None:
+            self.by_ip.setdefault(connection.ip, {})[connection] = None
+        if connection.user_id is not None:
+            self.by_user.setdefault(connection.user_id, {})[connection] = None
+
+    def remove(self, connection: ClientConnection) -> bool:
+        if self.by_socket.get(connection.websocket) is not connection:
+            return False
+        del self.by_socket[connection.websocket]
+        self._discard(self.by_role, connection.role, connection)
+        self._discard(self.by_client, connection.client_id, connection)
+        self._discard(self.by_ip, connection.ip, connection)
+        self._discard(self.by_user, connection.user_id, connection)
+        for topic in connection.topics:
+            self._discard(self.by_topic, topic, connection)
+        return True
+
+    def subscribe(self, connection: ClientConnection, topics: Iterable[str]) -> None:
+        for topic in topics:
+            if topic not in connection.topics:
+                connection.topics.add(topic)
+                self.by_topic.setdefault(topic, {})[connection] = None
+
+    def unsubscribe(self, connection: ClientConnection, topics: Iterable[str]) -> None:
+        for topic in topics:
+            if topic in connection.topics:
+                connection.topics.discard(topic)
+                self._discard(self.by_topic, topic, connection)
+
+    def subscribers(self, topics: Iterable[str]) -> Iterable[ClientConnection]:
+        """Connections subscribed to any of the topics, each listed once"""
+        topics = list(topics)
+        if len(topics) == 1:
+            return list(self.by_topic.get(topics[0], ()))
+        targets: Dict[ClientConnection, None] = {}
+        for topic in topics:
+            members = self.by_topic.get(topic)
+            if members:
+                targets.update(members)
+        return targets
+
+    def get(self, websocket: WebSocket) -> Optional[ClientConnection]:
+        return self.by_socket.get(websocket)
+
+    def role_members(self, role: str) -> List[ClientConnection]:
+        return list(self.by_role.get(role, ()))
+
+    def client_connections(self, client_id: str) -> List[ClientConnection]:
+        return list(self.by_client.get(client_id, ()))
+
+    def count_by_role(self) -> Dict[str, int]:
+        return {role: len(members) for role, members in self.by_role.items()}
+
+    @staticmethod
+    def _discard(index: Dict[str, Dict[ClientConnection, None]], key, connection):
+        members = index.get(key)
+        if members is None:
+            return
+        members.pop(connection, None)
+        if not members:
+            del index[key]
+
+
+# Message type of a single batch item for clients that did not ask for batches
+ITEM_TYPES = {
+    "inventory_batch": "inventory_update",
+    "low_stock_batch": "low_stock_alert",
+}
+
+
+def batch_payload(batch: Dict[str, Any], indexes: Iterable[int]) -> Dict[str, Any]:
+    """The message for the given items of a batch event"""
+    items = batch["items"]
+    return {
+        "type": batch["type"],
+        "seq": batch.get("seq"),
+        "data": {
+            "items": [items[i][1] for i in indexes],
+            "timestamp": batch["timestamp"],
+        },
+    }
+
+
+def item_payload(batch: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """One item of a batch event as the single-ingredient message"""
+    return {
+        "type": ITEM_TYPES[batch["type"]],
+        "seq": batch.get("seq"),
+        "data": {**batch["items"][index][1], "timestamp": batch["timestamp"]},
+    }
+
+
+def item_key(batch: Dict[str, Any], index: int) -> str:
+    """Coalesce key of a single-ingredient message"""
+    return f"{ITEM_TYPES[batch['type']]}:{batch['items'][index][1]['ingredient_id']}"
+
+
+class DeltaBatcher:
+    """
+    Collects inventory deltas over a short tick and sends them as one frame.
+
+    Repeated updates to the same ingredient within a tick are merged, the
+    latest value wins. Each distinct frame is serialized once and shared by
+    every connection that receives it. A batch is one event in the event
+    log and carries a single sequence number; clients that did not ask for
+    batches get its items as separate messages with that number.
+    """
+
+    def __init__(self, manager: "ConnectionManager", interval: float):
+        self.manager = manager
+        self.interval = interval
+        self.inventory: Dict[int, Dict[str, Any]] = {}
+        self.low_stock: Dict[int, Dict[str, Any]] = {}
+        self.merged = 0
+        self.frames = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Set[asyncio.Task] = set()
+
+    def add_inventory(self, ingredient_id: int, data: Dict[str, Any]) -> None:
+        self._add(self.inventory, ingredient_id, data)
+
+    def add_low_stock(self, ingredient_id: int, data: Dict[str, Any]) -> None:
+        self._add(self.low_stock, ingredient_id, data)
+
+    def _add(self, pending: Dict[int, Dict[str, Any]], ingredient_id, data) -> None:
+        if ingredient_id in pending:
+            self.merged += 1
+        pending[ingredient_id] = data
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.interval, self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        task = asyncio.create_task(self.flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        timestamp = datetime.now().isoformat()
+        for message_type, wildcard, pending in (
+            ("inventory_batch", TOPIC_INGREDIENTS, self.inventory),
+            ("low_stock_batch", TOPIC_ALERTS, self.low_stock),
+        ):
+            if not pending:
+                continue
+            items = [
+                [ingredient_topic(ingredient_id), data]
+                for ingredient_id, data in pending.items()
+            ]
+            pending.clear()
+            batch = {
+                "kind": "batch",
+                "type": message_type,
+                "wildcard": wildcard,
+                "items": items,
+                "timestamp": timestamp,
+            }
+            self.manager.events.append(batch, functools.partial(self._send, batch))
+
+    def _send(self, batch: Dict[str, Any], seq: Optional[int]) -> None:
+        self.frames += self.manager.deliver_batch(batch)
+        self.manager.relay_batch(batch)
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        max_queue: int = settings.WS_SEND_QUEUE_SIZE,
+        policy: str = settings.WS_OVERFLOW_POLICY,
+        send_timeout: float = settings.WS_SEND_TIMEOUT,
+    ):
+        self.connections = ConnectionRegistry()
+        self.max_queue = max_queue
+        self.policy = OverflowPolicy(policy)
+        self.send_timeout = send_timeout
+        self.metrics = FanoutMetrics()
+        self.backplane: Optional[PostgresBackplane] = None
+        self.batcher = DeltaBatcher(self, settings.WS_BATCH_INTERVAL)
+        self.events = EventLog(
+            settings.WS_EVENT_LOG_SIZE, settings.WS_EVENT_LOG_PERSIST
         )
+        self.ping_interval = settings.WS_PING_INTERVAL
+        self.pong_timeout = settings.WS_PONG_TIMEOUT
+        self.max_idle = settings.WS_MAX_IDLE
+        self._reaper: Optional[asyncio.Task] = None
+
+    def attach_backplane(self, backplane: PostgresBackplane) -> None:
+        """Relay broadcasts to and from the other workers"""
+        self.backplane = backplane
+        backplane.register("ws", self._receive_remote)
+        backplane.register("ws_batch", self._receive_remote_batch)
+
+    async def _receive_remote_batch(self, batch: Dict[str, Any]) -> None:
+        seq = self._remote_seq(batch)
+        if seq is None and self.events.persist:
+            # The sending worker could not store it
+            self.deliver_batch(batch)
+            return
+        self.events.append(batch, lambda seq: self.deliver_batch(batch), seq)
+
+    def _remote_seq(self, event: Dict[str, Any]) -> Optional[int]:
+        # Only a persisted log shares sequence numbers between workers;
+        # otherwise relayed events are numbered by the local log.
+        return event.get("seq") if self.events.persist else None
+
+    def relay_batch(self, batch: Dict[str, Any]):
+        if self.backplane is not None:
+            self.backplane.publish("ws_batch", batch)
+
+    def deliver_batch(self, batch: Dict[str, Any]) -> int:
+        """
+        Deliver a batch of per-ingredient items as a single frame per client.
+
+        Subscribers of the wildcard topic get every item. Other clients get
+        only the items whose topic they subscribe to; clients that want the
+        same subset share one frame, serialized once per encoding. Clients
+        that did not ask for batches get one message per item instead.
+        Returns the number of distinct frames.
+        """
+        items = batch["items"]
+        wildcard = batch["wildcard"]
+        frames: Dict[tuple, Frame] = {}
+        item_frames: Dict[int, Frame] = {}
+
+        def send(connection: ClientConnection, indexes: tuple) -> None:
+            if connection.batched:
+                message = frames.get(indexes)
+                if message is None:
+                    message = Frame(batch_payload(batch, indexes))
+                    frames[indexes] = message
+                connection.enqueue(message)
+                return
+            for index in indexes:
+                message = item_frames.get(index)
+                if message is None:
+                    message = Frame(item_payload(batch, index))
+                    item_frames[index] = message
+                connection.enqueue(message, item_key(batch, index))
+
+        everyone = self.connections.by_topic.get(wildcard, {})
+        if everyone:
+            indexes = tuple(range(len(items)))
+            for connection in list(everyone):
+                send(connection, indexes)
+
+        partial: Dict[ClientConnection, List[int]] = {}
+        for index, (topic, _) in enumerate(items):
+            for connection in self.connections.by_topic.get(topic, ()):
+                if connection not in everyone:
+                    partial.setdefault(connection, []).append(index)
+        for connection, indexes in partial.items():
+            send(connection, tuple(indexes))
+
+        return len(frames) + len(item_frames)
+
+    async def _receive_remote(self, payload: Dict[str, Any]) -> None:
+        message = payload["message"]
+        topics = payload.get("topics")
+        key = payload.get("key")
+
+        def send(message: Message) -> None:
+            if topics is None:
+                self._deliver_all(message, key)
+            else:
+                self._deliver(message, topics, key)
+
+        seq = self._remote_seq(message) if isinstance(message, dict) else None
+        if isinstance(message, dict) and (seq is not None or not self.events.persist):
+            self._sequence(message, topics, send, seq)
+        else:
+            # Text, or an event the sending worker could not store
+            send(message)
+
+    def _sequence(
+        self,
+        message: Dict[str, Any],
+        topics: Optional[List[str]],
+        send: Callable[[Message], None],
+        seq: Optional[int] = None,
+    ) -> None:
+        """
+        Record a message in the event log and send it stamped with its
+        sequence, once a persisted log has stored it.
+        """
+        message = {key: value for key, value in message.items() if key != "seq"}
+        entry = {"kind": "message", "topics": topics, "payload": message}
+
+        def stored(seq: Optional[int]) -> None:
+            send(message if seq is None else {**message, "seq": seq})
+
+        self.events.append(entry, stored, seq)
+
+    def _relay(self, message: Message, topics: Optional[List[str]], key: Optional[str]):
+        if self.backplane is not None:
+            self.backplane.publish(
+                "ws", {"message": message, "topics": topics, "key": key}
+            )
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        role: str,
+        encoding: str = ENCODING_JSON,
+        subprotocol: Optional[str] = None,
+        ip: Optional[str] = None,
+        user_id: Optional[int] = None,
+        batched: bool = False,
+    ) -> Optional[ClientConnection]:
+        """
+        Accept a connection and subscribe it to the default topics, or close
+        it with 1008 and return None when its IP or user is at the limit.
+
+        The limits are checked and the connection registered before the
+        handshake awaits anything, so concurrent handshakes cannot all pass.
+        """
+        reason = self.check_limits(ip, user_id)
+        if reason:
+            # 1008: policy violation
+            await websocket.close(code=1008, reason=reason)
+            return None
+        connection = ClientConnection(
+            websocket,
+            client_id,
+            getattr(role, "value", role),
+            metrics=self.metrics,
+            max_queue=self.max_queue,
+            policy=self.policy,
+            send_timeout=self.send_timeout,
+            encoding=encoding,
+            batched=batched,
+            ip=ip,
+            user_id=user_id,
+        )
+        self.connections.add(connection)
+        try:
+            await websocket.accept(subprotocol=subprotocol)
+        except BaseException:
+            self.connections.remove(connection)
+            raise
+        if connection.closed:
+            # Closed during the handshake, e.g. at shutdown; the sender
+            # closes the socket
+            connection.start(self.connections.remove)
+            return None
+        self.connections.subscribe(
+            connection, [*settings.WS_DEFAULT_TOPICS, role_topic(connection.role)]
+        )
+        connection.start(self.connections.remove)
+        connection.enqueue(
+            Frame(
+                {
+                    "type": "hello",
+                    "epoch": self.events.epoch,
+                    "seq": self.events.last_seq,
+                    "encoding": encoding,
+                    "batch": batched,
+                }
+            )
+        )
+        return connection
+
+    def check_limits(self, ip: Optional[str], user_id: Optional[int]) -> Optional[str]:
+        """Reason to refuse a new connection from this IP/user, if any"""
+        limit = settings.WS_MAX_CONNECTIONS_PER_IP
+        if (
+            ip is not None
+            and limit
+            and len(self.connections.by_ip.get(ip, ())) >= limit
+        ):
+            self.metrics.rejected += 1
+            return "Too many connections from this address"
+        limit = settings.WS_MAX_CONNECTIONS_PER_USER
+        if (
+            user_id is not None
+            and limit
+            and len(self.connections.by_user.get(user_id, ())) >= limit
+        ):
+            self.metrics.rejected += 1
+            return "Too many connections for this user"
+        return None
+
+    def start_reaper(self) -> None:
+        if self._reaper is None and (self.ping_interval or self.max_idle):
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def stop_reaper(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+
+    async def _reap_forever(self) -> None:
+        intervals = [i for i in (self.ping_interval, self.pong_timeout) if i]
+        tick = max(min(intervals or [self.max_idle]) / 2, 0.5)
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                self.reap()
+            except Exception as e:
+                logger.exception(f"WebSocket reaper failed: {e}")
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """
+        Send due pings and close connections that missed a pong or have
+        been idle too long. Returns the number of connections reaped.
+        """
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for connection in self.connections:
+            if (
+                connection.ping_pending
+                and self.pong_timeout
+                and now - connection.last_ping > self.pong_timeout
+            ):
+                self.metrics.reaped_pong_timeout += 1
+            elif self.max_idle and now - connection.last_seen > self.max_idle:
+                self.metrics.reaped_idle += 1
+            else:
+                if (
+                    self.ping_interval
+                    and not connection.ping_pending
+                    and now - connection.last_ping >= self.ping_interval
+                ):
+                    connection.last_ping = now
+                    connection.ping_pending = True
+                    connection.enqueue(Frame({"type": "ping"}))
+                continue
+            # 1001: going away
+            connection.close_code = 1001
+            self.connections.remove(connection)
+            connection.close()
+            reaped += 1
+        return reaped
 
     def disconnect(self, websocket: WebSocket):
-        for i, connection in enumerate(self.active_connections):
-            if connection["websocket"] == websocket:
-                self.active_connections.pop(i)
-                break
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self.connections.remove(connection)
+            connection.close()
+
+    async def close_all(self) -> None:
+        """Close every connection and wait for their senders to finish"""
+        connections = list(self.connections)
+        for connection in connections:
+            # 1001: going away
+            connection.close_code = 1001
+            self.connections.remove(connection)
+            connection.close()
+        await asyncio.gather(*(c.wait_closed() for c in connections))
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(message)
+        else:
+            await websocket.send_text(message)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection["websocket"].send_text(message)
+    async def send_to_client(
+        self, message: str, client_id: str, key: Optional[str] = None
+    ):
+        for connection in self.connections.client_connections(client_id):
+            connection.enqueue(message, key)
+
+    async def broadcast(self, message: Message, key: Optional[str] = None):
+        def send(message: Message) -> None:
+            self._deliver_all(message, key)
+            self._relay(message, None, key)
+
+        if isinstance(message, dict):
+            self._sequence(message, None, send)
+        else:
+            send(message)
+
+    async def publish(
+        self, message: Message, topics: Iterable[str], key: Optional[str] = None
+    ):
+        """
+        Send a message to every connection subscribed to any of the topics.
+
+        A dict message is wrapped in a Frame and encoded per client; a string
+        is sent as text as-is.
+        """
+        topics = list(topics)
+
+        def send(message: Message) -> None:
+            self._deliver(message, topics, key)
+            self._relay(message, topics, key)
+
+        if isinstance(message, dict):
+            self._sequence(message, topics, send)
+        else:
+            send(message)
+
+    def _deliver_all(self, message: Message, key: Optional[str]):
+        if isinstance(message, dict):
+            message = Frame(message)
+        for connection in self.connections:
+            connection.enqueue(message, key)
+
+    def _deliver(self, message: Message, topics: List[str], key: Optional[str]):
+        if isinstance(message, dict):
+            message = Frame(message)
+        for connection in self.connections.subscribers(topics):
+            connection.enqueue(message, key)
+
+    async def broadcast_to_role(
+        self, message: Message, role: str, key: Optional[str] = None
+    ):
+        await self.publish(message, [role_topic(getattr(role, "value", role))], key)
+
+    async def handle_message(self, websocket: WebSocket, data: str):
+        """
+        Handle a command sent by a client.
+
+        Commands are JSON objects:
+            {"action": "subscribe", "topics": ["ingredient:3", "alerts"]}
+            {"action": "unsubscribe", "topics": ["ingredients"]}
+            {"action": "subscriptions"}
+            {"action": "resume", "epoch": "...", "last_seq": 1234}
+            {"action": "pong"} in reply to a server {"type": "ping"}
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+
+        # Any message from the client proves it is alive
+        connection.last_seen = time.monotonic()
+        connection.ping_pending = False
+
+        try:
+            command = json.loads(data)
+            action = command["action"]
+            topics = command.get("topics", [])
+            if not isinstance(topics, list):
+                raise ValueError("topics must be a list")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            connection.enqueue(Frame({"type": "error", "message": "Invalid command"}))
+            return
 
-    async def broadcast_to_role(self, message: str, role: str):
-        for connection in self.active_connections:
-            if connection["role"] == role:
-                await connection["websocket"].send_text(message)
+        if action == "pong":
+            return
+        if action == "ping":
+            connection.enqueue(Frame({"type": "pong"}))
+            return
+
+        if action == "resume":
+            await self.resume(connection, command.get("epoch"), command.get("last_seq"))
+            return
+
+        if action == "subscribe":
+            invalid = [
+                t
+                for t in topics
+                if not isinstance(t, str) or not is_valid_topic(t, connection.role)
+            ]
+            if invalid:
+                connection.enqueue(
+                    Frame(
+                        {
+                            "type": "error",
+                            "message": "Unknown topics",
+                            "topics": invalid,
+                        }
+                    )
+                )
+                return
+            if len(connection.topics | set(topics)) > settings.WS_MAX_SUBSCRIPTIONS:
+                connection.enqueue(
+                    Frame({"type": "error", "message": "Too many subscriptions"})
+                )
+                return
+            self.connections.subscribe(connection, topics)
+        elif action == "unsubscribe":
+            self.connections.unsubscribe(
+                connection, [t for t in topics if isinstance(t, str)]
+            )
+        elif action != "subscriptions":
+            connection.enqueue(
+                Frame({"type": "error", "message": f"Unknown action: {action}"})
+            )
+            return
+
+        connection.enqueue(
+            Frame({"type": "subscriptions", "topics": sorted(connection.topics)})
+        )
+
+    async def resume(self, connection: ClientConnection, epoch, last_seq) -> None:
+        """
+        Replay the events a reconnecting client missed since last_seq.
+
+        If the client's epoch is unknown or the gap is larger than the event
+        log (or the client's queue) can replay, it is told to load a fresh
+        snapshot instead.
+        """
+        missed = None
+        if epoch == self.events.epoch and isinstance(last_seq, int):
+            # Replaying more than the client's queue holds would drop events
+            missed = await self.events.since(last_seq, connection.max_queue - 1)
+        else:
+            self.events.snapshots += 1
+
+        if missed is None:
+            connection.enqueue(
+                Frame(
+                    {
+                        "type": "snapshot_required",
+                        "epoch": self.events.epoch,
+                        "seq": self.events.last_seq,
+                    }
+                )
+            )
+            return
+
+        replayed = 0
+        for entry in missed:
+            for message in self._replay_messages(connection, entry):
+                connection.enqueue(Frame(message))
+                replayed += 1
+        connection.enqueue(
+            Frame(
+                {
+                    "type": "resumed",
+                    "epoch": self.events.epoch,
+                    "seq": self.events.last_seq,
+                    "replayed": replayed,
+                }
+            )
+        )
+
+    @staticmethod
+    def _replay_messages(
+        connection: ClientConnection, entry: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """The messages for the part of a logged event the connection wants"""
+        if entry["kind"] == "batch":
+            if entry["wildcard"] in connection.topics:
+                indexes = range(len(entry["items"]))
+            else:
+                indexes = [
+                    i
+                    for i, (topic, _) in enumerate(entry["items"])
+                    if topic in connection.topics
+                ]
+            if not indexes:
+                return []
+            if connection.batched:
+                return [batch_payload(entry, indexes)]
+            return [item_payload(entry, index) for index in indexes]
+
+        topics = entry["topics"]
+        if topics is not None and connection.topics.isdisjoint(topics):
+            return []
+        return [{**entry["payload"], "seq": entry["seq"]}]
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and drop metrics of the fan-out"""
+        depths = [connection.depth for connection in self.connections]
+        # Stale: a ping has gone unanswered for over half the pong timeout
+        stale = 0
+        if self.pong_timeout:
+            late = time.monotonic() - self.pong_timeout / 2
+            stale = sum(
+                1
+                for connection in self.connections
+                if connection.ping_pending and connection.last_ping < late
+            )
+        return {
+            "connections": len(depths),
+            "connections_by_role": self.connections.count_by_role(),
+            "clients": len(self.connections.by_client),
+            "topics": len(self.connections.by_topic),
+            "overflow_policy": self.policy.value,
+            "max_queue_size": self.max_queue,
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "sent_total": self.metrics.sent,
+            "dropped_total": self.metrics.dropped,
+            "coalesced_total": self.metrics.coalesced,
+            "slow_disconnects_total": self.metrics.slow_disconnects,
+            "send_errors_total": self.metrics.send_errors,
+            "live_connections": len(depths) - stale,
+            "stale_connections": stale,
+            "reaped_pong_timeout_total": self.metrics.reaped_pong_timeout,
+            "reaped_idle_total": self.metrics.reaped_idle,
+            "rejected_total": self.metrics.rejected,
+            "batches_merged_total": self.batcher.merged,
+            "batch_frames_total": self.batcher.frames,
+            "event_log": self.events.stats(),
+            "backplane": self.backplane.stats() if self.backplane else None,
+            "event_bus": bus.stats(),
+        }
 
     async def broadcast_inventory_update(
         self, ingredient_id: int, ingredient_name: str, quantity: float
     ):
-        message = json.dumps(
+        self.batcher.add_inventory(
+            ingredient_id,
             {
-                "type": "inventory_update",
-                "data": {
-                    "ingredient_id": ingredient_id,
-                    "ingredient_name": ingredient_name,
-                    "quantity": quantity,
-                    "timestamp": datetime.now().isoformat(),
-                },
-            }
+                "ingredient_id": ingredient_id,
+                "ingredient_name": ingredient_name,
+                "quantity": quantity,
+            },
         )
-        await self.broadcast(message)
 
     async def broadcast_alert(
         self, alert_type: str, message: str, related_id: Optional[int] = None
@@ -68,7 +1031,7 @@ class ConnectionManager:
         if related_id:
             alert_data["data"]["related_id"] = related_id
 
-        await self.broadcast(json.dumps(alert_data))
+        await self.publish(alert_data, [TOPIC_ALERTS])
 
     async def broadcast_low_stock_alert(
         self,
@@ -77,19 +1040,33 @@ class ConnectionManager:
         quantity: float,
         min_quantity: float,
     ):
-        message = json.dumps(
+        self.batcher.add_low_stock(
+            ingredient_id,
             {
-                "type": "low_stock_alert",
-                "data": {
-                    "ingredient_id": ingredient_id,
-                    "ingredient_name": ingredient_name,
-                    "current_quantity": quantity,
-                    "min_quantity": min_quantity,
-                    "timestamp": datetime.now().isoformat(),
-                },
-            }
+                "ingredient_id": ingredient_id,
+                "ingredient_name": ingredient_name,
+                "current_quantity": quantity,
+                "min_quantity": min_quantity,
+            },
+        )
+
+    async def broadcast_meal_availability(
+        self, meal_id: int, meal_name: str, available_portions: int
+    ):
+        message = {
+            "type": "meal_availability",
+            "data": {
+                "meal_id": meal_id,
+                "meal_name": meal_name,
+                "available_portions": available_portions,
+                "timestamp": datetime.now().isoformat(),
+            },
+        }
+        await self.publish(
+            message,
+            [TOPIC_MEALS, meal_topic(meal_id)],
+            key=f"meal_availability:{meal_id}",
         )
-        await self.broadcast(message)
 
 
 manager = ConnectionManager()
@@ -99,42 +1076,87 @@ async def check_low_stock():
     """Background task to check for low stock ingredients and send alerts"""
     while True:
         try:
-            db = SessionLocal()
-            # Get all ingredients with quantity below min_quantity
-            low_stock_ingredients = (
-                db.query(Ingredient)
-                .filter(Ingredient.quantity < Ingredient.min_quantity)
-                .all()
-            )
-
-            for ingredient in low_stock_ingredients:
-                # Create alert in database
-                alert = Alert(
-                    message=f"Low stock alert: {ingredient.name} is below minimum quantity ({ingredient.quantity}g < {ingredient.min_quantity}g)",
-                    alert_type=AlertType.ingredient_low,
-                    related_ingredient_id=ingredient.id,
-                )
-                db.add(alert)
-
-                # Send real-time alert via WebSocket
-                await manager.broadcast_low_stock_alert(
-                    ingredient_id=ingredient.id,
-                    ingredient_name=ingredient.name,
-                    quantity=ingredient.quantity,
-                    min_quantity=ingredient.min_quantity,
+            async with AsyncSessionLocal() as db:
+                # Get all ingredients with quantity below min_quantity
+                result = await db.execute(
+                    select(Ingredient).where(
+                        Ingredient.quantity < Ingredient.min_quantity
+                    )
                 )
+                low_stock_ingredients = result.scalars().all()
 
-            db.commit()
-            db.close()
-        except Exception as e:
-            print(f"Error in check_low_stock: {e}")
-            if "db" in locals():
-                db.close()
+                for ingredient in low_stock_ingredients:
+                    # Create alert in database
+                    alert = Alert(
+                        message=f"Low stock alert: {ingredient.name} is below minimum quantity ({ingredient.quantity}g < {ingredient.min_quantity}g)",
+                        alert_type=AlertType.ingredient_low,
+                        related_ingredient_id=ingredient.id,
+                    )
+                    db.add(alert)
+
+                    # Send real-time alert via WebSocket
+                    await manager.broadcast_low_stock_alert(
+                        ingredient_id=ingredient.id,
+                        ingredient_name=ingredient.name,
+                        quantity=ingredient.quantity,
+                        min_quantity=ingredient.min_quantity,
+                    )
+
+                await db.commit()
+        except Exception:
+            logger.exception("Error in check_low_stock")
 
         # Check every 5 minutes
         await asyncio.sleep(300)
 
 
+async def on_stock_changed(event: StockChanged):
+    await manager.broadcast_inventory_update(
+        ingredient_id=event.ingredient_id,
+        ingredient_name=event.ingredient_name,
+        quantity=event.quantity,
+    )
+    if event.became_low:
+        await manager.broadcast_low_stock_alert(
+            ingredient_id=event.ingredient_id,
+            ingredient_name=event.ingredient_name,
+            quantity=event.quantity,
+            min_quantity=event.min_quantity,
+        )
+
+
+async def on_meal_served(event: MealServed):
+    async with AsyncSessionLocal() as db:
+        portions = await db.run_sync(
+            lambda session: meal_serving.calculate_available_portions(
+                session, meal_id=event.meal_id
+            )
+        )
+    if "meal_id" in portions:
+        await manager.broadcast_meal_availability(
+            meal_id=portions["meal_id"],
+            meal_name=portions["meal_name"],
+            available_portions=portions["available_portions"],
+        )
+
+
 async def start_background_tasks():
     """Start background tasks for WebSocket notifications"""
+    bus.subscribe(StockChanged, on_stock_changed)
+    bus.subscribe(MealServed, on_meal_served)
+    await manager.events.start()
+    manager.start_reaper()
+    backplane = create_backplane()
+    if backplane is not None:
+        manager.attach_backplane(backplane)
+        await backplane.start()
     asyncio.create_task(check_low_stock())
+
+
+async def stop_background_tasks():
+    """Stop the reaper and backplane listener and close open connections"""
+    await manager.stop_reaper()
+    await manager.events.stop()
+    if manager.backplane is not None:
+        await manager.backplane.stop()
+    await manager.close_all()
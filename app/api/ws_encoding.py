@@ -0,0 +1,103 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, clients then fall back to JSON
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+# Sec-WebSocket-Protocol values a client can offer instead of ?encoding=
+SUBPROTOCOLS = {
+    "kitchen.json": ENCODING_JSON,
+    "kitchen.msgpack": ENCODING_MSGPACK,
+}
+
+# Fixed item layouts for the compact encoding. Batch items are sent as arrays
+# in this field order instead of objects with repeated keys.
+COMPACT_ITEM_FIELDS = {
+    "inventory_batch": ("ingredient_id", "quantity", "ingredient_name"),
+    "low_stock_batch": (
+        "ingredient_id",
+        "current_quantity",
+        "min_quantity",
+        "ingredient_name",
+    ),
+}
+
+
+def available_encodings() -> List[str]:
+    if msgpack is None:
+        return [ENCODING_JSON]
+    return [ENCODING_JSON, ENCODING_MSGPACK]
+
+
+def negotiate_encoding(
+    websocket: WebSocket, requested: Optional[str] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Pick the encoding for a connection.
+
+    The client either offers one of SUBPROTOCOLS in Sec-WebSocket-Protocol or
+    passes ?encoding=. Returns the encoding and the subprotocol to accept.
+    Anything unknown or unavailable falls back to JSON.
+    """
+    encodings = available_encodings()
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        encoding = SUBPROTOCOLS.get(subprotocol)
+        if encoding in encodings:
+            return encoding, subprotocol
+    if requested in encodings:
+        return requested, None
+    return ENCODING_JSON, None
+
+
+def _epoch_ms(timestamp: Any) -> Any:
+    if isinstance(timestamp, str):
+        try:
+            return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+        except ValueError:
+            return timestamp
+    return timestamp
+
+
+def compact(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shrink a message for the binary encoding: timestamps become epoch
+    milliseconds and batch items become fixed-layout arrays.
+    """
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        return payload
+    data = dict(data)
+    if "timestamp" in data:
+        data["timestamp"] = _epoch_ms(data["timestamp"])
+    fields = COMPACT_ITEM_FIELDS.get(payload.get("type"))
+    if fields is not None:
+        data["items"] = [[item.get(f) for f in fields] for item in data["items"]]
+    return {**payload, "data": data}
+
+
+class Frame:
+    """A message that is serialized at most once per encoding"""
+
+    __slots__ = ("payload", "_encoded")
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+
+    def encode(self, encoding: str) -> Union[str, bytes]:
+        data = self._encoded.get(encoding)
+        if data is None:
+            if encoding == ENCODING_MSGPACK:
+                data = msgpack.packb(compact(self.payload))
+            else:
+                data = json.dumps(self.payload)
+            self._encoded[encoding] = data
+        return data
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.session import AsyncSessionLocal
+from app.models.models import RealtimeEvent
+
+logger = logging.getLogger(__name__)
+
+# Persisted events older than this many sequence numbers are pruned
+PERSIST_KEEP_FACTOR = 10
+PRUNE_EVERY = 1000
+# Most events stored by one INSERT
+PERSIST_BATCH_SIZE = 500
+# A failed insert is retried this often, waiting twice as long each time,
+# before its events are sent without a sequence number
+PERSIST_RETRIES = 3
+PERSIST_RETRY_DELAY = 0.5
+
+# Called with the sequence number of a recorded event, None if it has none
+OnStored = Callable[[Optional[int]], None]
+
+
+class EventLog:
+    """
+    Numbers real-time events and keeps the latest ones for replay.
+
+    Every event gets a monotonically increasing sequence number and is kept
+    in a bounded ring buffer, so a reconnecting client can ask for what it
+    missed instead of refetching everything. In memory the numbering is per
+    process and identified by a random epoch. When persisted, the sequence
+    is the id of a row in realtime_events, shared by all workers, and gaps
+    larger than the ring buffer are read back from the table.
+
+    Persisted events are stored by a writer task: broadcasts only queue
+    them, and everything queued while an INSERT runs goes into the next one.
+    """
+
+    def __init__(self, size: int, persist: bool = False):
+        self.size = size
+        self.persist = persist
+        self.epoch = "db" if persist else uuid.uuid4().hex[:12]
+        self.entries: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.last_seq = 0
+        self.replayed = 0
+        self.snapshots = 0
+        self.unsequenced = 0
+        self._stored = 0
+        self._pending: Deque[Tuple[Dict[str, Any], OnStored]] = deque()
+        self._writer: Optional[asyncio.Task] = None
+
+    def append(
+        self, entry: Dict[str, Any], on_stored: OnStored, seq: Optional[int] = None
+    ) -> None:
+        """
+        Record an event and call on_stored with its sequence number. A new
+        event of a persisted log is queued for the writer task; on_stored
+        runs once it is stored, in the order of append, with None if storing
+        it failed.
+        """
+        if seq is None and self.persist:
+            self._pending.append((entry, on_stored))
+            if self._writer is None or self._writer.done():
+                self._writer = asyncio.create_task(self._write())
+            return
+        if seq is None:
+            seq = self.last_seq + 1
+        self._record(entry, seq)
+        on_stored(seq)
+
+    def _record(self, entry: Dict[str, Any], seq: int) -> None:
+        entry["seq"] = seq
+        self.last_seq = max(self.last_seq, seq)
+        self._insert(entry)
+
+    def _insert(self, entry: Dict[str, Any]) -> None:
+        # Relayed events can arrive out of order; the buffer stays sorted by
+        # seq, so it always drops the oldest event and starts with the lowest
+        entries = self.entries
+        index = len(entries)
+        while index and entries[index - 1]["seq"] > entry["seq"]:
+            index -= 1
+        if index == len(entries):
+            entries.append(entry)
+            return
+        if len(entries) == entries.maxlen:
+            if index == 0:
+                return
+            entries.popleft()
+            index -= 1
+        entries.insert(index, entry)
+
+    async def start(self) -> None:
+        """Continue the numbering of a persisted log after a restart"""
+        if self.persist:
+            self.last_seq = max(self.last_seq, await self._max_seq())
+
+    async def stop(self) -> None:
+        """Wait until queued events are stored"""
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+
+    async def since(self, last_seq: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Up to limit events after last_seq in order, or None when the gap is
+        too large to replay and the client has to load a snapshot instead.
+        """
+        if last_seq >= self.last_seq:
+            return []
+        # The buffer is sorted, see _insert
+        oldest = self.entries[0]["seq"] if self.entries else self.last_seq + 1
+        if last_seq >= oldest - 1:
+            missed = [entry for entry in self.entries if entry["seq"] > last_seq]
+        elif self.persist:
+            # The ring buffer starts after last_seq, e.g. right after a deploy
+            missed = await self._load(last_seq, limit + 1)
+        else:
+            missed = None
+
+        if missed is None or len(missed) > limit:
+            self.snapshots += 1
+            return None
+        self.replayed += len(missed)
+        return sorted(missed, key=lambda entry: entry["seq"])
+
+    async def _write(self) -> None:
+        while self._pending:
+            count = min(len(self._pending), PERSIST_BATCH_SIZE)
+            batch = [self._pending.popleft() for _ in range(count)]
+            seqs = await self._store_retrying([entry for entry, _ in batch])
+            for (entry, on_stored), seq in zip(batch, seqs):
+                if seq is not None:
+                    self._record(entry, seq)
+                on_stored(seq)
+
+    async def _store_retrying(
+        self, entries: List[Dict[str, Any]]
+    ) -> List[Optional[int]]:
+        delay = PERSIST_RETRY_DELAY
+        for attempt in range(PERSIST_RETRIES + 1):
+            try:
+                return await self._store(entries)
+            except (SQLAlchemyError, OSError) as e:
+                if attempt == PERSIST_RETRIES:
+                    error = e
+                    break
+                logger.warning(
+                    f"Storing {len(entries)} real-time events failed, "
+                    f"retrying in {delay}s: {e}"
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+        self.unsequenced += len(entries)
+        logger.error(
+            f"Could not store {len(entries)} real-time events, sending them "
+            f"without sequence numbers: {error}"
+        )
+        return [None] * len(entries)
+
+    async def _store(self, entries: List[Dict[str, Any]]) -> List[int]:
+        async with AsyncSessionLocal() as db:
+            seqs = list(
+                await db.scalars(
+                    insert(RealtimeEvent).returning(
+                        RealtimeEvent.id, sort_by_parameter_order=True
+                    ),
+                    [{"payload": json.dumps(entry)} for entry in entries],
+                )
+            )
+            if (self._stored + len(seqs)) // PRUNE_EVERY != self._stored // PRUNE_EVERY:
+                await db.execute(
+                    delete(RealtimeEvent).where(
+                        RealtimeEvent.id <= max(seqs) - self.size * PERSIST_KEEP_FACTOR
+                    )
+                )
+            await db.commit()
+        self._stored += len(seqs)
+        return seqs
+
+    async def _max_seq(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return (await db.scalar(select(func.max(RealtimeEvent.id)))) or 0
+
+    async def _load(self, last_seq: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        async with AsyncSessionLocal() as db:
+            oldest = await db.scalar(select(func.min(RealtimeEvent.id)))
+            if oldest is None or oldest > last_seq + 1:
+                # Events right after last_seq were already pruned
+                return None
+            rows = await db.scalars(
+                select(RealtimeEvent)
+                .where(RealtimeEvent.id > last_seq)
+                .order_by(RealtimeEvent.id)
+                .limit(limit)
+            )
+            return [{**json.loads(row.payload), "seq": row.id} for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "epoch": self.epoch,
+            "last_seq": self.last_seq,
+            "buffered": len(self.entries),
+            "buffer_size": self.size,
+            "persisted": self.persist,
+            "replayed_total": self.replayed,
+            "snapshots_total": self.snapshots,
+            "pending": len(self._pending),
+            "unsequenced_total": self.unsequenced,
+        }
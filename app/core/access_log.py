@@ -0,0 +1,147 @@
+import logging
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.access")
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to a QueueListener thread. Formatting happens there too,
+    and a full queue drops the record instead of blocking the request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Access records only carry immutable arguments, so they can be
+        # formatted later on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLog:
+    """Moves writing access log lines off the event loop, see start()"""
+
+    def __init__(self):
+        self.handler: Optional[DroppingQueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+
+    def start(self) -> None:
+        """
+        Route app.access records through a queue to the root logger's
+        handlers. Until then they propagate to the root logger directly.
+        """
+        if self._listener is not None:
+            return
+        log_queue: queue.Queue = queue.Queue(settings.ACCESS_LOG_QUEUE_SIZE)
+        self.handler = DroppingQueueHandler(log_queue)
+        self._listener = QueueListener(
+            log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        self._listener.start()
+        logger.addHandler(self.handler)
+        logger.propagate = False
+
+    def stop(self) -> None:
+        """Write the queued lines and log directly again"""
+        if self._listener is None:
+            return
+        logger.removeHandler(self.handler)
+        logger.propagate = True
+        self._listener.stop()
+        self._listener = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"dropped_total": self.handler.dropped if self.handler else 0}
+
+
+access_log = AccessLog()
+
+
+class AccessLogMiddleware:
+    """
+    Logs method, path, status and duration of HTTP requests.
+
+    Requests slower than ACCESS_LOG_SLOW_SECONDS and server errors are
+    logged as warnings every time; other requests only for a sampled share
+    and not at all with ACCESS_LOG_SLOW_ONLY. The duration, status and
+    client are also record attributes for structured formatters.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: Optional[float] = None,
+        slow_seconds: Optional[float] = None,
+        slow_only: Optional[bool] = None,
+    ):
+        self.app = app
+        self.sample_rate = (
+            settings.ACCESS_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        )
+        self.slow_seconds = (
+            settings.ACCESS_LOG_SLOW_SECONDS if slow_seconds is None else slow_seconds
+        )
+        self.slow_only = (
+            settings.ACCESS_LOG_SLOW_ONLY if slow_only is None else slow_only
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.log(scope, status, time.perf_counter() - started)
+
+    def log(self, scope: Scope, status: int, elapsed: float) -> None:
+        if status >= 500 or 0 < self.slow_seconds <= elapsed:
+            level = logging.WARNING
+        elif self.slow_only or random.random() >= self.sample_rate:
+            return
+        else:
+            level = logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        client = scope.get("client")
+        logger.log(
+            level,
+            "%s %s - %s - %.4fs",
+            scope["method"],
+            scope["path"],
+            status,
+            elapsed,
+            extra={
+                "http_method": scope["method"],
+                "http_path": scope["path"],
+                "http_status": status,
+                "duration_ms": round(elapsed * 1000, 3),
+                "client_addr": client[0] if client else None,
+            },
+        )
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import User, UserRole
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """The fields of a user that authorization and /users/me need"""
+
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str]
+    role: UserRole
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+class AuthCache:
+    """
+    Decoded tokens and user principals, so authenticated requests skip the
+    JWT decode and the users query.
+
+    Both maps are LRU bounded by size and principals expire after ttl
+    seconds. CRUDUser.update drops a user's principal in this worker right
+    away and bumps users.auth_version; every worker compares a stamp of all
+    auth versions at most every version_interval seconds and clears its
+    principals when the stamp moved.
+    """
+
+    def __init__(self, size: int, ttl: float, version_interval: float):
+        self.size = size
+        self.ttl = ttl
+        self.version_interval = version_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # token -> (user id, exp claim as a unix timestamp)
+        self._tokens: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        # user id -> (principal, monotonic time it was cached)
+        self._principals: "OrderedDict[int, Tuple[UserPrincipal, float]]" = (
+            OrderedDict()
+        )
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and self.ttl > 0
+
+    def get_token(self, token: str) -> Optional[int]:
+        """The user id of a token decoded before, unless it has expired"""
+        with self._lock:
+            cached = self._tokens.get(token)
+            if cached is None:
+                return None
+            user_id, exp = cached
+            if exp <= time.time():
+                del self._tokens[token]
+                return None
+            self._tokens.move_to_end(token)
+            return user_id
+
+    def put_token(self, token: str, user_id: int, exp: Optional[float]) -> None:
+        if not self.enabled or exp is None:
+            return
+        with self._lock:
+            self._tokens[token] = (user_id, exp)
+            self._tokens.move_to_end(token)
+            if len(self._tokens) > self.size:
+                self._tokens.popitem(last=False)
+
+    def get_principal(self, user_id: int) -> Optional[UserPrincipal]:
+        with self._lock:
+            cached = self._principals.get(user_id)
+            if cached is None or time.monotonic() - cached[1] >= self.ttl:
+                self.misses += 1
+                return None
+            self._principals.move_to_end(user_id)
+            self.hits += 1
+            return cached[0]
+
+    def put_principal(self, principal: UserPrincipal) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._principals[principal.id] = (principal, time.monotonic())
+            self._principals.move_to_end(principal.id)
+            if len(self._principals) > self.size:
+                self._principals.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            if self._principals.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._principals)
+            self._principals.clear()
+
+    def check_version(self, db: Session) -> None:
+        """Drop all principals if any worker changed a user since the last check"""
+        if self._version_due():
+            self._apply_stamp(db.execute(self._stamp_query()).one())
+
+    async def acheck_version(self, db: AsyncSession) -> None:
+        if self._version_due():
+            self._apply_stamp((await db.execute(self._stamp_query())).one())
+
+    def _version_due(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < self.version_interval:
+            return False
+        self._checked_at = now
+        return True
+
+    @staticmethod
+    def _stamp_query():
+        return select(
+            func.coalesce(func.sum(User.auth_version), 0), func.count(User.id)
+        )
+
+    def _apply_stamp(self, row) -> None:
+        stamp = (int(row[0]), int(row[1]))
+        if self._stamp is not None and stamp != self._stamp:
+            self.clear()
+        self._stamp = stamp
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": len(self._tokens),
+            "principals": len(self._principals),
+            "hits_total": self.hits,
+            "misses_total": self.misses,
+            "invalidations_total": self.invalidations,
+        }
+
+
+auth_cache = AuthCache(
+    settings.AUTH_CACHE_SIZE,
+    settings.AUTH_CACHE_TTL,
+    settings.AUTH_CACHE_VERSION_INTERVAL,
+)
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import psycopg2
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7999
+# Larger events are sent in parts carrying this many characters of the
+# event; JSON escaping at most doubles them, which still fits a NOTIFY
+PART_CHARS = 3500
+# Events whose parts are still arriving; beyond this the oldest is dropped
+MAX_PARTIAL = 100
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class PostgresBackplane:
+    """
+    Pub/sub between worker processes over Postgres LISTEN/NOTIFY.
+
+    Every worker runs a single listener task on a dedicated connection and
+    hands incoming events to the handler registered for their kind. Events
+    carry a message id; ids this worker published or already relayed are
+    remembered, so nothing is delivered twice. Publishing only queues the
+    event, a separate task sends the NOTIFY. Events too large for one
+    NOTIFY are split into parts and put back together by the receivers.
+    """
+
+    def __init__(
+        self,
+        database_uri: str,
+        channel: str,
+        *,
+        reconnect_delay: float = 5.0,
+        remember: int = 10000,
+    ):
+        self.database_uri = database_uri
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.origin = uuid.uuid4().hex
+        self.published = 0
+        self.received = 0
+        self.duplicates = 0
+        self.incomplete = 0
+        self._remember = remember
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._partial: "OrderedDict[str, List[Optional[str]]]" = OrderedDict()
+        self._handlers: Dict[str, Handler] = {}
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        self._outbox = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._publisher()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def publish(self, kind: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Queue an event for the other workers and return its message id"""
+        if self._outbox is None:
+            return None
+        message_id = uuid.uuid4().hex
+        body = json.dumps(
+            {"id": message_id, "origin": self.origin, "kind": kind, "payload": payload}
+        )
+        self._mark_seen(message_id)
+        if len(body.encode()) <= MAX_PAYLOAD_BYTES:
+            self._outbox.put_nowait(body)
+            return message_id
+        parts = [
+            body[start : start + PART_CHARS]
+            for start in range(0, len(body), PART_CHARS)
+        ]
+        for index, part in enumerate(parts):
+            self._outbox.put_nowait(
+                json.dumps(
+                    {
+                        "id": message_id,
+                        "part": index,
+                        "parts": len(parts),
+                        "data": part,
+                    }
+                )
+            )
+        return message_id
+
+    def _mark_seen(self, message_id: str) -> bool:
+        """Remember a message id; returns False if it was already known"""
+        if message_id in self._seen:
+            return False
+        self._seen[message_id] = None
+        if len(self._seen) > self._remember:
+            self._seen.popitem(last=False)
+        return True
+
+    def _connect_listener(self):
+        url = make_url(self.database_uri)
+        conn = psycopg2.connect(
+            **url.translate_connect_args(username="user", database="dbname")
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    async def _listen(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                conn = await asyncio.to_thread(self._connect_listener)
+            except Exception as e:
+                logger.warning(f"Backplane listener could not connect: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            inbox: asyncio.Queue = asyncio.Queue()
+            loop.add_reader(conn, self._drain, loop, conn, inbox)
+            try:
+                while True:
+                    notify = await inbox.get()
+                    if notify is None:
+                        logger.warning("Backplane listener connection lost")
+                        break
+                    await self._dispatch(notify.payload)
+            finally:
+                loop.remove_reader(conn)
+                conn.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    @staticmethod
+    def _drain(loop, conn, inbox: asyncio.Queue) -> None:
+        try:
+            conn.poll()
+        except Exception:
+            loop.remove_reader(conn)
+            inbox.put_nowait(None)
+            return
+        while conn.notifies:
+            inbox.put_nowait(conn.notifies.pop(0))
+
+    def _join(self, event: Dict[str, Any]) -> Optional[str]:
+        """Store one part of a split event; returns the event once complete"""
+        message_id = event["id"]
+        parts = self._partial.get(message_id)
+        if parts is None:
+            parts = self._partial[message_id] = [None] * event["parts"]
+            if len(self._partial) > MAX_PARTIAL:
+                self._partial.popitem(last=False)
+                self.incomplete += 1
+                logger.warning(
+                    "Backplane dropped an event whose parts never all arrived"
+                )
+        parts[event["part"]] = event["data"]
+        if any(part is None for part in parts):
+            return None
+        del self._partial[message_id]
+        return "".join(parts)
+
+    async def _dispatch(self, raw: str) -> None:
+        try:
+            event = json.loads(raw)
+            if "part" in event:
+                if event["id"] in self._seen:
+                    # A part of an event this worker sent or already has
+                    return
+                raw = self._join(event)
+                if raw is None:
+                    return
+                event = json.loads(raw)
+            message_id = event["id"]
+            kind = event["kind"]
+        except (ValueError, KeyError, TypeError, IndexError):
+            logger.warning("Backplane received a malformed event")
+            return
+        if not self._mark_seen(message_id):
+            self.duplicates += 1
+            return
+        self.received += 1
+        handler = self._handlers.get(kind)
+        if handler is None:
+            return
+        try:
+            await handler(event["payload"])
+        except Exception as e:
+            logger.exception(f"Backplane handler for {kind} failed: {e}")
+
+    def _notify(self, bodies) -> None:
+        with engine.connect() as connection:
+            for body in bodies:
+                connection.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": body},
+                )
+            connection.commit()
+
+    async def _publisher(self) -> None:
+        while True:
+            bodies = [await self._outbox.get()]
+            while not self._outbox.empty():
+                bodies.append(self._outbox.get_nowait())
+            try:
+                await asyncio.to_thread(self._notify, bodies)
+                self.published += len(bodies)
+            except Exception as e:
+                logger.warning(f"Backplane failed to publish {len(bodies)} events: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.channel,
+            "published_total": self.published,
+            "received_total": self.received,
+            "duplicates_total": self.duplicates,
+            "incomplete_total": self.incomplete,
+            "pending": self._outbox.qsize() if self._outbox is not None else 0,
+        }
+
+
+def create_backplane() -> Optional[PostgresBackplane]:
+    if not settings.WS_BACKPLANE_ENABLED:
+        return None
+    if make_url(settings.SQLALCHEMY_DATABASE_URI).get_backend_name() != "postgresql":
+        logger.warning("WS_BACKPLANE_ENABLED needs PostgreSQL, backplane disabled")
+        return None
+    return PostgresBackplane(
+        settings.SQLALCHEMY_DATABASE_URI, settings.WS_BACKPLANE_CHANNEL
+    )
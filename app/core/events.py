@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Type
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import is_write_statement
+
+logger = logging.getLogger(__name__)
+
+# Key in Session.info under which events wait for the transaction to commit
+PENDING_KEY = "domain_events"
+# Key in Session.info collecting the tables written by the transaction
+TABLES_KEY = "written_tables"
+
+
+@dataclass(frozen=True)
+class StockChanged:
+    """The quantity of an ingredient changed"""
+
+    ingredient_id: int
+    ingredient_name: str
+    quantity: float
+    previous_quantity: float
+    min_quantity: float
+    reason: str
+
+    @property
+    def became_low(self) -> bool:
+        return (
+            self.quantity < self.min_quantity
+            and self.previous_quantity >= self.min_quantity
+        )
+
+
+@dataclass(frozen=True)
+class MealServed:
+    serving_id: int
+    meal_id: int
+    portions: int
+    served_by: int
+
+
+@dataclass(frozen=True)
+class DeliveryReceived:
+    delivery_id: int
+    ingredient_id: int
+    quantity: float
+    created_by: int
+
+
+@dataclass(frozen=True)
+class RecordsChanged:
+    """A transaction that wrote to these tables committed"""
+
+    tables: FrozenSet[str]
+
+
+Handler = Callable[[Any], Awaitable[None]]
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for domain events.
+
+    The CRUD layer records events on the session and they are published only
+    once the transaction commits; a rollback discards them. Publishing hands
+    the event to the event loop and returns immediately, also from the
+    threadpool that runs sync endpoints. A single dispatcher task calls the
+    async subscribers, so a slow subscriber never delays a request.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self._handlers: Dict[Type, List[Handler]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, event_type: Type, handler: Handler) -> None:
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def publish(self, event: Any) -> None:
+        """Queue an event for the subscribers; never blocks"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            # No dispatcher, e.g. in scripts and migrations
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._put(event)
+        else:
+            loop.call_soon_threadsafe(self._put, event)
+
+    def publish_after_commit(self, db: Session, *events: Any) -> None:
+        """Publish events once the session's current transaction commits"""
+        db.info.setdefault(PENDING_KEY, []).extend(events)
+
+    def _put(self, event: Any) -> None:
+        try:
+            self._queue.put_nowait(event)
+            self.published += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Event bus full, dropped {type(event).__name__}")
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        self._loop = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _dispatch(self) -> None:
+        while True:
+            event = await self._queue.get()
+            for handler in self._handlers.get(type(event), ()):
+                try:
+                    await handler(event)
+                    self.delivered += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.exception(
+                        f"Subscriber {handler.__name__} failed on "
+                        f"{type(event).__name__}: {e}"
+                    )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "published_total": self.published,
+            "delivered_total": self.delivered,
+            "dropped_total": self.dropped,
+            "failed_total": self.failed,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+bus = EventBus(settings.EVENT_BUS_QUEUE_SIZE)
+
+
+@sa_event.listens_for(Session, "after_flush")
+def _collect_tables(session: Session, flush_context) -> None:
+    tables = session.info.setdefault(TABLES_KEY, set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        tables.add(obj.__tablename__)
+
+
+@sa_event.listens_for(Session, "do_orm_execute")
+def _collect_statement_tables(orm_execute_state) -> None:
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    statement = orm_execute_state.statement
+    if is_write_statement(orm_execute_state):
+        tables = orm_execute_state.session.info.setdefault(TABLES_KEY, set())
+        tables.add(statement.table.name)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for pending in session.info.pop(PENDING_KEY, ()):
+        bus.publish(pending)
+    tables = session.info.pop(TABLES_KEY, None)
+    if tables:
+        bus.publish(RecordsChanged(frozenset(tables)))
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_KEY, None)
+    session.info.pop(TABLES_KEY, None)
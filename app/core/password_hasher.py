@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core import security
+from app.core.config import settings
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashing jobs are already waiting"""
+
+
+def _timed(fn: Callable, *args) -> Tuple[Any, float, float]:
+    # Runs in a worker process; wall clock times are comparable across processes
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification in a small dedicated process pool.
+
+    Keeps a burst of logins from occupying the threadpool that serves the
+    rest of the API. At most max_pending jobs may be queued or running;
+    further ones raise PasswordHasherBusy instead of piling up. With zero
+    workers the work runs in the calling thread.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs threads and an event loop
+                # is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+        submitted = time.time()
+        try:
+            if self.workers > 0:
+                future = self._get_executor().submit(_timed, fn, *args)
+            else:
+                future = Future()
+                future.set_result(_timed(fn, *args))
+        except BaseException:
+            self._finished()
+            raise
+        future.add_done_callback(lambda done: self._record(done, submitted))
+        return future
+
+    def _finished(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def _record(self, future: Future, submitted: float) -> None:
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                return
+            _, started, finished = future.result()
+            wait = max(0.0, started - submitted)
+            self.completed += 1
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            self.run_seconds += finished - started
+
+    def hash(self, password: str) -> str:
+        return self._submit(security.get_password_hash, password).result()[0]
+
+    def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return self._submit(
+            security.verify_and_update_password, password, hashed_password
+        ).result()[0]
+
+    async def ahash(self, password: str) -> str:
+        future = self._submit(security.get_password_hash, password)
+        return (await asyncio.wrap_future(future))[0]
+
+    async def averify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        future = self._submit(
+            security.verify_and_update_password, password, hashed_password
+        )
+        return (await asyncio.wrap_future(future))[0]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed_total": self.completed,
+            "rejected_total": self.rejected,
+            "rehashed_total": self.rehashed,
+            "wait_seconds_total": round(self.wait_seconds, 6),
+            "wait_seconds_max": round(self.max_wait_seconds, 6),
+            "run_seconds_total": round(self.run_seconds, 6),
+        }
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING
+)
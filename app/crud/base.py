@@ -1,27 +1,83 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.db.base_class import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+# INSERT statements that support ON CONFLICT, by dialect name
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def chunks(items: Sequence[Any], size: Optional[int] = None) -> Iterator[List[Any]]:
+    size = size or settings.DB_BULK_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield list(items[start : start + size])
+
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # Loader options for every read, e.g. selectinload of relationships the
+    # response schema includes, so they never load lazily one row at a time
+    load_options: Sequence[Any] = ()
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
     def get(self, db: Session, id: Any) -> Optional[ModelType]:
-        return db.query(self.model).filter(self.model.id == id).first()
+        return (
+            db.query(self.model)
+            .options(*self.load_options)
+            .filter(self.model.id == id)
+            .first()
+        )
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Any] = None,
     ) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        return self.paginate(
+            db.query(self.model).options(*self.load_options),
+            skip=skip,
+            limit=limit,
+            after=after,
+        ).all()
+
+    def paginate(
+        self, query, *, skip: int = 0, limit: int = 100, after: Optional[Any] = None
+    ):
+        """
+        Order a query by id and cut one page from it. after is the last id
+        of the previous page: a keyset seek that, unlike skip, does not read
+        and discard the rows before the page.
+        """
+        query = query.order_by(self.model.id)
+        if after is not None:
+            query = query.filter(self.model.id > after)
+        return query.offset(skip).limit(limit)
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
@@ -36,8 +92,169 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db: Session,
         *,
         db_obj: ModelType,
-        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
     ) -> ModelType:
+        self._apply_update(db_obj, obj_in)
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def update_by_id(
+        self, db: Session, *, id: Any, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> Optional[ModelType]:
+        """
+        Update only the fields given with one UPDATE ... WHERE id = :id
+        RETURNING, without loading the row first. None if no row has this id.
+        """
+        columns = self.model.__table__.columns
+        values = {
+            field: value
+            for field, value in self._update_values(obj_in).items()
+            if field in columns and field != "id"
+        }
+        if not values:
+            return self.get(db, id=id)
+        db_obj = db.scalars(
+            update(self.model)
+            .where(self.model.id == id)
+            .values(**values)
+            .returning(self.model)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        ).one_or_none()
+        if db_obj is not None:
+            # Keep the returned state; commit would expire it and the next
+            # attribute access would SELECT the row again
+            db.expunge(db_obj)
+        db.commit()
+        return db_obj
+
+    def remove(self, db: Session, *, id: int) -> ModelType:
+        obj = db.query(self.model).get(id)
+        db.delete(obj)
+        db.commit()
+        return obj
+
+    # Bulk variants: one statement per DB_BULK_CHUNK_SIZE rows and a single
+    # commit. Rows are reloaded with one SELECT per chunk after the commit.
+
+    def get_many(self, db: Session, *, ids: Sequence[Any]) -> List[ModelType]:
+        """Objects with the given ids in the order of ids; unknown ids are skipped"""
+        return self._get_many_by(db, self.model.id, ids)
+
+    def create_many(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]],
+    ) -> List[ModelType]:
+        ids = self._insert_many(db, [self._create_values(obj_in) for obj_in in objs_in])
+        db.commit()
+        return self.get_many(db, ids=sorted(ids))
+
+    def update_many(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Union[UpdateSchemaType, Dict[str, Any]]],
+    ) -> List[ModelType]:
+        """
+        Update rows by primary key; every item carries its id next to the
+        fields to change. An id that does not exist raises StaleDataError and
+        nothing is committed.
+        """
+        rows = [self._update_values(obj_in) for obj_in in objs_in]
+        for chunk in chunks(rows):
+            db.execute(update(self.model), chunk)
+        db.commit()
+        return self.get_many(db, ids=[row["id"] for row in rows])
+
+    def upsert_many(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]],
+        conflict_columns: Sequence[str],
+    ) -> List[ModelType]:
+        """
+        INSERT ... ON CONFLICT (conflict_columns) DO UPDATE. Needs a unique
+        index on conflict_columns; of items with the same key the last wins.
+        """
+        make_insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        if make_insert is None:
+            raise ValueError(f"Upsert is not supported on {db.get_bind().dialect.name}")
+        rows = {}
+        for obj_in in objs_in:
+            row = self._create_values(obj_in)
+            rows[tuple(row[column] for column in conflict_columns)] = row
+        ids: List[Any] = []
+        for chunk in chunks(list(rows.values())):
+            stmt = make_insert(self.model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_=self._upsert_set(stmt, chunk[0], conflict_columns),
+            )
+            ids.extend(db.scalars(stmt.returning(self.model.id), chunk))
+        db.commit()
+        return self.get_many(db, ids=ids)
+
+    def _insert_many(
+        self, db: Session, rows: List[Dict[str, Any]], ordered: bool = False
+    ) -> List[Any]:
+        """
+        INSERT ... RETURNING id for each chunk, without committing. The ids
+        come back in no particular order unless ordered is set; then they
+        match rows one to one, at the cost of row by row inserts on SQLite.
+        """
+        ids: List[Any] = []
+        for chunk in chunks(rows):
+            ids.extend(
+                db.scalars(
+                    insert(self.model).returning(
+                        self.model.id, sort_by_parameter_order=ordered
+                    ),
+                    chunk,
+                )
+            )
+        return ids
+
+    def _get_many_by(
+        self, db: Session, column, values: Sequence[Any]
+    ) -> List[ModelType]:
+        values = list(dict.fromkeys(values))
+        found = {}
+        for chunk in chunks(values):
+            for obj in db.scalars(
+                select(self.model).options(*self.load_options).where(column.in_(chunk))
+            ):
+                found[getattr(obj, column.key)] = obj
+        return [found[value] for value in values if value in found]
+
+    def _upsert_set(
+        self, stmt, row: Dict[str, Any], conflict_columns: Sequence[str]
+    ) -> Dict[str, Any]:
+        values = {key: stmt.excluded[key] for key in row if key not in conflict_columns}
+        # ON CONFLICT DO UPDATE does not apply onupdate defaults by itself
+        for column in self.model.__table__.columns:
+            if column.onupdate is not None and column.name not in values:
+                values[column.name] = column.onupdate.arg
+        return values
+
+    def _create_values(
+        self, obj_in: Union[CreateSchemaType, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        return dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump()
+
+    def _update_values(
+        self, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return dict(obj_in)
+        return obj_in.model_dump(exclude_unset=True)
+
+    def _apply_update(
+        self, db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> None:
         obj_data = jsonable_encoder(db_obj)
         if isinstance(obj_in, dict):
             update_data = obj_in
@@ -46,13 +263,54 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         for field in obj_data:
             if field in update_data:
                 setattr(db_obj, field, update_data[field])
+
+    # Async variants for AsyncSession, used from async endpoints and tasks
+
+    async def aget(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        return await db.get(self.model, id, options=self.load_options)
+
+    async def aget_multi(
+        self,
+        db: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Any] = None,
+    ) -> List[ModelType]:
+        result = await db.execute(
+            self.paginate(
+                select(self.model).options(*self.load_options),
+                skip=skip,
+                limit=limit,
+                after=after,
+            )
+        )
+        return list(result.scalars().all())
+
+    async def acreate(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
         return db_obj
 
-    def remove(self, db: Session, *, id: int) -> ModelType:
-        obj = db.query(self.model).get(id)
-        db.delete(obj)
-        db.commit()
+    async def aupdate(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+    ) -> ModelType:
+        self._apply_update(db_obj, obj_in)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def aremove(self, db: AsyncSession, *, id: int) -> Optional[ModelType]:
+        obj = await db.get(self.model, id)
+        if obj is not None:
+            await db.delete(obj)
+            await db.commit()
         return obj
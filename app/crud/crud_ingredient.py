@@ -1,5 +1,7 @@
-from typing import List, Optional, Dict, Any
+from collections import defaultdict
+from typing import List, Optional, Dict, Any, Sequence, Tuple, Union
 
+from app.core.events import DeliveryReceived, StockChanged, bus
 from app.crud.base import CRUDBase
 from app.models.models import Ingredient, IngredientDelivery
 from app.schemas.ingredient import (
@@ -8,9 +10,32 @@ from app.schemas.ingredient import (
     IngredientDeliveryCreate,
     IngredientDeliveryUpdate,
 )
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 
+def stock_changed(
+    ingredient: Ingredient, previous_quantity: float, reason: str
+) -> StockChanged:
+    return StockChanged(
+        ingredient_id=ingredient.id,
+        ingredient_name=ingredient.name,
+        quantity=ingredient.quantity,
+        previous_quantity=previous_quantity,
+        min_quantity=ingredient.min_quantity,
+        reason=reason,
+    )
+
+
+def stock_levels(
+    ingredients: List[Ingredient], key: str
+) -> Dict[Any, Tuple[float, float]]:
+    return {
+        getattr(ingredient, key): (ingredient.quantity, ingredient.min_quantity)
+        for ingredient in ingredients
+    }
+
+
 class CRUDIngredient(CRUDBase[Ingredient, IngredientCreate, IngredientUpdate]):
     def create(self, db: Session, *, obj_in: IngredientCreate) -> Ingredient:
         db_obj = Ingredient(
@@ -23,18 +48,110 @@ class CRUDIngredient(CRUDBase[Ingredient, IngredientCreate, IngredientUpdate]):
         db.refresh(db_obj)
         return db_obj
 
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Ingredient,
+        obj_in: Union[IngredientUpdate, Dict[str, Any]]
+    ) -> Ingredient:
+        previous_quantity = db_obj.quantity
+        previous_min_quantity = db_obj.min_quantity
+        db_obj = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        if (
+            db_obj.quantity != previous_quantity
+            or db_obj.min_quantity != previous_min_quantity
+        ):
+            # Already committed, so publish right away
+            bus.publish(stock_changed(db_obj, previous_quantity, "update"))
+        return db_obj
+
+    def update_by_id(
+        self, db: Session, *, id: Any, obj_in: Union[IngredientUpdate, Dict[str, Any]]
+    ) -> Optional[Ingredient]:
+        values = self._update_values(obj_in)
+        previous = None
+        if "quantity" in values or "min_quantity" in values:
+            # StockChanged needs the old level; the lock keeps it from moving
+            # before the UPDATE
+            previous = db.execute(
+                select(Ingredient.quantity, Ingredient.min_quantity)
+                .where(Ingredient.id == id)
+                .with_for_update()
+            ).one_or_none()
+            if previous is None:
+                return None
+        db_obj = super().update_by_id(db, id=id, obj_in=values)
+        if (
+            db_obj is not None
+            and previous is not None
+            and (db_obj.quantity, db_obj.min_quantity) != tuple(previous)
+        ):
+            bus.publish(stock_changed(db_obj, previous.quantity, "update"))
+        return db_obj
+
+    def update_many(
+        self, db: Session, *, objs_in: Sequence[Union[IngredientUpdate, Dict[str, Any]]]
+    ) -> List[Ingredient]:
+        rows = [self._update_values(obj_in) for obj_in in objs_in]
+        before = stock_levels(self.get_many(db, ids=[row["id"] for row in rows]), "id")
+        ingredients = super().update_many(db, objs_in=rows)
+        self._publish_stock_changes(before, ingredients, "id")
+        return ingredients
+
+    def upsert_many(
+        self,
+        db: Session,
+        *,
+        objs_in: Sequence[Union[IngredientCreate, Dict[str, Any]]],
+        conflict_columns: Sequence[str] = ("name",)
+    ) -> List[Ingredient]:
+        """Create ingredients, or update the ones whose name already exists"""
+        rows = [self._create_values(obj_in) for obj_in in objs_in]
+        existing = self.get_many_by_name(db, names=[row["name"] for row in rows])
+        before = stock_levels(existing, "name")
+        ingredients = super().upsert_many(
+            db, objs_in=rows, conflict_columns=conflict_columns
+        )
+        self._publish_stock_changes(before, ingredients, "name")
+        return ingredients
+
+    def _publish_stock_changes(
+        self,
+        before: Dict[Any, Tuple[float, float]],
+        ingredients: List[Ingredient],
+        key: str,
+    ) -> None:
+        # Already committed, so publish right away
+        for ingredient in ingredients:
+            previous = before.get(getattr(ingredient, key))
+            if previous is not None and previous != (
+                ingredient.quantity,
+                ingredient.min_quantity,
+            ):
+                bus.publish(stock_changed(ingredient, previous[0], "update"))
+
     def get_by_name(self, db: Session, *, name: str) -> Optional[Ingredient]:
         return db.query(Ingredient).filter(Ingredient.name == name).first()
 
+    def get_many_by_name(
+        self, db: Session, *, names: Sequence[str]
+    ) -> List[Ingredient]:
+        return self._get_many_by(db, Ingredient.name, names)
+
     def update_quantity(
         self, db: Session, *, db_obj: Ingredient, quantity_change: float
     ) -> Ingredient:
         """
         Update ingredient quantity by adding (or subtracting if negative) the specified amount
         """
+        previous_quantity = db_obj.quantity
         new_quantity = max(0, db_obj.quantity + quantity_change)
         db_obj.quantity = new_quantity
         db.add(db_obj)
+        bus.publish_after_commit(
+            db, stock_changed(db_obj, previous_quantity, "adjustment")
+        )
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -67,22 +184,76 @@ class CRUDIngredientDelivery(
             db.query(Ingredient).filter(Ingredient.id == obj_in.ingredient_id).first()
         )
         if ingredient:
+            previous_quantity = ingredient.quantity
             ingredient.quantity += obj_in.quantity
             db.add(ingredient)
+            bus.publish_after_commit(
+                db,
+                DeliveryReceived(
+                    delivery_id=db_obj.id,
+                    ingredient_id=ingredient.id,
+                    quantity=obj_in.quantity,
+                    created_by=user_id,
+                ),
+                stock_changed(ingredient, previous_quantity, "delivery"),
+            )
             db.commit()
 
         return db_obj
 
-    def get_by_ingredient(
-        self, db: Session, *, ingredient_id: int, skip: int = 0, limit: int = 100
+    def create_many_with_user(
+        self, db: Session, *, objs_in: Sequence[IngredientDeliveryCreate], user_id: int
     ) -> List[IngredientDelivery]:
-        return (
-            db.query(IngredientDelivery)
-            .filter(IngredientDelivery.ingredient_id == ingredient_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
+        """
+        Record many deliveries in one transaction and add them to stock, one
+        update per ingredient however many deliveries it received.
+        """
+        ids = self._insert_many(
+            db,
+            [{**obj_in.model_dump(), "created_by": user_id} for obj_in in objs_in],
+            ordered=True,
+        )
+        received: Dict[int, float] = defaultdict(float)
+        for obj_in in objs_in:
+            received[obj_in.ingredient_id] += obj_in.quantity
+        changes = []
+        for stocked in ingredient.get_many(db, ids=list(received)):
+            previous_quantity = stocked.quantity
+            stocked.quantity += received[stocked.id]
+            changes.append(stock_changed(stocked, previous_quantity, "delivery"))
+        bus.publish_after_commit(
+            db,
+            *changes,
+            *(
+                DeliveryReceived(
+                    delivery_id=delivery_id,
+                    ingredient_id=obj_in.ingredient_id,
+                    quantity=obj_in.quantity,
+                    created_by=user_id,
+                )
+                for obj_in, delivery_id in zip(objs_in, ids)
+            ),
         )
+        db.commit()
+        return self.get_many(db, ids=sorted(ids))
+
+    def get_by_ingredient(
+        self,
+        db: Session,
+        *,
+        ingredient_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[int] = None
+    ) -> List[IngredientDelivery]:
+        return self.paginate(
+            db.query(IngredientDelivery).filter(
+                IngredientDelivery.ingredient_id == ingredient_id
+            ),
+            skip=skip,
+            limit=limit,
+            after=after,
+        ).all()
 
 
 ingredient = CRUDIngredient(Ingredient)
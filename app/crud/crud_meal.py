@@ -1,12 +1,19 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence, Union
 
-from app.crud.base import CRUDBase
+from app.crud.base import CRUDBase, chunks
 from app.models.models import Meal, MealIngredient
 from app.schemas.ingredient import MealCreate, MealUpdate, MealIngredientCreate
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 
 class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
+    # Responses include the recipe lines with ingredient names: one query
+    # for the meals, one for all their lines joined to ingredients
+    load_options = (
+        selectinload(Meal.meal_ingredients).joinedload(MealIngredient.ingredient),
+    )
+
     def create_with_ingredients(
         self, db: Session, *, obj_in: MealCreate, user_id: int
     ) -> Meal:
@@ -30,8 +37,37 @@ class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
             db.add(meal_ingredient)
         
         db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        return self.get(db, id=db_obj.id)
+
+    def create_many_with_ingredients(
+        self, db: Session, *, objs_in: Sequence[MealCreate], user_id: int
+    ) -> List[Meal]:
+        """Create meals and all their ingredients in one transaction"""
+        meal_ids = self._insert_many(
+            db,
+            [
+                {
+                    "name": obj_in.name,
+                    "description": obj_in.description,
+                    "created_by": user_id,
+                }
+                for obj_in in objs_in
+            ],
+            ordered=True,
+        )
+        meal_ingredients = [
+            {
+                "meal_id": meal_id,
+                "ingredient_id": ingredient_data.ingredient_id,
+                "quantity": ingredient_data.quantity,
+            }
+            for obj_in, meal_id in zip(objs_in, meal_ids)
+            for ingredient_data in obj_in.ingredients
+        ]
+        for chunk in chunks(meal_ingredients):
+            db.execute(insert(MealIngredient), chunk)
+        db.commit()
+        return self.get_many(db, ids=sorted(meal_ids))
 
     def update_with_ingredients(
         self, db: Session, *, db_obj: Meal, obj_in: MealUpdate
@@ -46,28 +82,35 @@ class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
         
         # Update ingredients if provided
         if "ingredients" in update_data and update_data["ingredients"] is not None:
-            # Remove existing ingredients
-            db.query(MealIngredient).filter(MealIngredient.meal_id == db_obj.id).delete()
-            
-            # Add new ingredients
-            for ingredient_data in update_data["ingredients"]:
-                meal_ingredient = MealIngredient(
-                    meal_id=db_obj.id,
+            # Replace the loaded recipe lines; delete-orphan removes the old ones
+            db_obj.meal_ingredients = [
+                MealIngredient(
                     ingredient_id=ingredient_data["ingredient_id"],
                     quantity=ingredient_data["quantity"],
                 )
-                db.add(meal_ingredient)
+                for ingredient_data in update_data["ingredients"]
+            ]
         
         db.add(db_obj)
         db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        return self.get(db, id=db_obj.id)
+
+    def update_by_id(
+        self, db: Session, *, id: int, obj_in: Union[MealUpdate, Dict[str, Any]]
+    ) -> Optional[Meal]:
+        if super().update_by_id(db, id=id, obj_in=obj_in) is None:
+            return None
+        # RETURNING has no recipe lines; load the meal the way reads do
+        return self.get(db, id=id)
 
     def get_by_name(self, db: Session, *, name: str) -> Optional[Meal]:
         return db.query(Meal).filter(Meal.name == name).first()
 
+    def get_many_by_name(self, db: Session, *, names: Sequence[str]) -> List[Meal]:
+        return self._get_many_by(db, Meal.name, names)
+
     def get_with_ingredients(self, db: Session, *, id: int) -> Optional[Meal]:
-        return db.query(Meal).filter(Meal.id == id).first()
+        return self.get(db, id=id)
 
 
 meal = CRUDMeal(Meal)
@@ -1,7 +1,9 @@
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 
+from app.core.events import MealServed, bus
 from app.crud.base import CRUDBase
+from app.crud.crud_ingredient import stock_changed
 from app.models.models import MealServing, Meal, MealIngredient, Ingredient
 from app.schemas.meal_serving import MealServingCreate, MealServingUpdate
 from sqlalchemy import func
@@ -40,6 +42,7 @@ class CRUDMealServing(CRUDBase[MealServing, MealServingCreate, MealServingUpdate
                 return None
 
         # Deduct ingredients from inventory
+        events = []
         for meal_ingredient in meal_ingredients:
             ingredient = (
                 db.query(Ingredient)
@@ -48,8 +51,10 @@ class CRUDMealServing(CRUDBase[MealServing, MealServingCreate, MealServingUpdate
             )
 
             required_quantity = meal_ingredient.quantity * obj_in.portions
+            previous_quantity = ingredient.quantity
             ingredient.quantity -= required_quantity
             db.add(ingredient)
+            events.append(stock_changed(ingredient, previous_quantity, "serving"))
 
         # Create meal serving record
         db_obj = MealServing(
@@ -58,31 +63,51 @@ class CRUDMealServing(CRUDBase[MealServing, MealServingCreate, MealServingUpdate
             served_by=user_id,
         )
         db.add(db_obj)
+        db.flush()
+        events.append(
+            MealServed(
+                serving_id=db_obj.id,
+                meal_id=db_obj.meal_id,
+                portions=db_obj.portions,
+                served_by=user_id,
+            )
+        )
+        bus.publish_after_commit(db, *events)
         db.commit()
         db.refresh(db_obj)
         return db_obj
 
     def get_by_meal(
-        self, db: Session, *, meal_id: int, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        meal_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[int] = None
     ) -> List[MealServing]:
-        return (
-            db.query(MealServing)
-            .filter(MealServing.meal_id == meal_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return self.paginate(
+            db.query(MealServing).filter(MealServing.meal_id == meal_id),
+            skip=skip,
+            limit=limit,
+            after=after,
+        ).all()
 
     def get_by_user(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[int] = None
     ) -> List[MealServing]:
-        return (
-            db.query(MealServing)
-            .filter(MealServing.served_by == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return self.paginate(
+            db.query(MealServing).filter(MealServing.served_by == user_id),
+            skip=skip,
+            limit=limit,
+            after=after,
+        ).all()
 
     def calculate_available_portions(
         self, db: Session, *, meal_id: int
@@ -1,5 +1,5 @@
 from typing import List, Dict, Any, Optional
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func, extract
 import calendar
@@ -14,10 +14,27 @@ from app.models.models import (
     Alert,
     AlertType,
 )
-from app.schemas.reports import MonthlyReportCreate, MonthlyReportUpdate
+from app.schemas.reports import (
+    AlertCreate,
+    AlertUpdate,
+    MonthlyReportCreate,
+    MonthlyReportUpdate,
+)
 from app.core.portion_calculator import calculate_all_meals_portions
 
 
+def in_days(column, start_date: date, end_date: date):
+    """
+    Filter for column falling on start_date..end_date inclusive. A range on
+    the raw timestamp works the same on PostgreSQL and SQLite, where
+    date() returns text, and can use an index on the column.
+    """
+    return (
+        column >= datetime.combine(start_date, time.min),
+        column < datetime.combine(end_date + timedelta(days=1), time.min),
+    )
+
+
 class CRUDMonthlyReport(
     CRUDBase[MonthlyReport, MonthlyReportCreate, MonthlyReportUpdate]
 ):
@@ -49,8 +66,7 @@ class CRUDMonthlyReport(
         total_portions_served = (
             db.query(func.sum(MealServing.portions))
             .filter(
-                func.date(MealServing.served_at) >= start_date,
-                func.date(MealServing.served_at) <= end_date,
+                *in_days(MealServing.served_at, start_date, end_date),
             )
             .scalar()
             or 0
@@ -121,8 +137,7 @@ class CRUDMonthlyReport(
         meal_servings = (
             db.query(MealServing)
             .filter(
-                func.date(MealServing.served_at) >= start_date,
-                func.date(MealServing.served_at) <= end_date,
+                *in_days(MealServing.served_at, start_date, end_date),
             )
             .all()
         )
@@ -142,7 +157,7 @@ class CRUDMonthlyReport(
 
             # Calculate usage for each meal serving on this day
             for serving in meal_servings:
-                if func.date(serving.served_at) == current_date:
+                if serving.served_at.date() == current_date:
                     # Find if this meal uses the ingredient
                     for meal_ingredient in meal_ingredients:
                         if meal_ingredient.meal_id == serving.meal_id:
@@ -161,8 +176,7 @@ class CRUDMonthlyReport(
             db.query(IngredientDelivery)
             .filter(
                 IngredientDelivery.ingredient_id == ingredient_id,
-                func.date(IngredientDelivery.delivery_date) >= start_date,
-                func.date(IngredientDelivery.delivery_date) <= end_date,
+                *in_days(IngredientDelivery.delivery_date, start_date, end_date),
             )
             .all()
         )
@@ -197,8 +211,7 @@ class CRUDMonthlyReport(
             db.query(MealServing)
             .filter(
                 MealServing.meal_id == meal_id,
-                func.date(MealServing.served_at) >= start_date,
-                func.date(MealServing.served_at) <= end_date,
+                *in_days(MealServing.served_at, start_date, end_date),
             )
             .all()
         )
@@ -211,7 +224,7 @@ class CRUDMonthlyReport(
 
             # Calculate portions served on this day
             for serving in meal_servings:
-                if func.date(serving.served_at) == current_date:
+                if serving.served_at.date() == current_date:
                     daily_portions += serving.portions
 
             serving_data.append(
@@ -311,4 +324,25 @@ class CRUDMonthlyReport(
         }
 
 
+class CRUDAlert(CRUDBase[Alert, AlertCreate, AlertUpdate]):
+    def get_unread(
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[int] = None,
+    ) -> List[Alert]:
+        return self.paginate(
+            db.query(Alert).filter(Alert.is_read == False),
+            skip=skip,
+            limit=limit,
+            after=after,
+        ).all()
+
+    def mark_read(self, db: Session, *, id: int) -> Optional[Alert]:
+        return self.update_by_id(db, id=id, obj_in={"is_read": True})
+
+
 monthly_report = CRUDMonthlyReport(MonthlyReport)
+alert = CRUDAlert(Alert)
@@ -1,10 +1,16 @@
-from typing import List, Optional, Dict, Any
+from dataclasses import fields
+from typing import List, Optional, Dict, Any, Union
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
 from app.models.models import User, UserRole
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash, verify_password
+from app.core.auth_cache import UserPrincipal, auth_cache
+from app.core.password_hasher import password_hasher
+
+# User columns copied into cached principals
+PRINCIPAL_FIELDS = {field.name for field in fields(UserPrincipal)} - {"id"}
 
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
@@ -14,11 +20,15 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     def get_by_username(self, db: Session, *, username: str) -> Optional[User]:
         return db.query(User).filter(User.username == username).first()
 
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
+    def create(
+        self, db: Session, *, obj_in: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
+        if hashed_password is None:
+            hashed_password = password_hasher.hash(obj_in.password)
         db_obj = User(
             email=obj_in.email,
             username=obj_in.username,
-            hashed_password=get_password_hash(obj_in.password),
+            hashed_password=hashed_password,
             full_name=obj_in.full_name,
             role=obj_in.role,
             is_active=obj_in.is_active,
@@ -28,13 +38,56 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         db.refresh(db_obj)
         return db_obj
 
+    async def acreate(self, db: Session, *, obj_in: UserCreate) -> User:
+        """
+        Like create, but waits for bcrypt without holding a threadpool
+        thread; only the insert runs in the threadpool.
+        """
+        hashed_password = await password_hasher.ahash(obj_in.password)
+        return await run_in_threadpool(
+            self.create, db, obj_in=obj_in, hashed_password=hashed_password
+        )
+
     def update(self, db: Session, *, db_obj: User, obj_in: UserUpdate) -> User:
         update_data = obj_in.dict(exclude_unset=True)
         if "password" in update_data and update_data["password"]:
-            hashed_password = get_password_hash(update_data["password"])
+            hashed_password = password_hasher.hash(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        previous = UserPrincipal.from_user(db_obj)
+        for field, value in update_data.items():
+            if hasattr(previous, field) and getattr(previous, field) != value:
+                # Tell every worker that cached principals of this user are stale
+                db_obj.auth_version = (db_obj.auth_version or 0) + 1
+                break
+        db_obj = super().update(db, db_obj=db_obj, obj_in=update_data)
+        auth_cache.invalidate_user(db_obj.id)
+        return db_obj
+
+    def update_by_id(
+        self, db: Session, *, id: int, obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> Optional[User]:
+        update_data = self._update_values(obj_in)
+        password = update_data.pop("password", None)
+        if password:
+            update_data["hashed_password"] = password_hasher.hash(password)
+        if PRINCIPAL_FIELDS.intersection(update_data):
+            # The old values are not read, so any principal field counts as
+            # a change
+            update_data["auth_version"] = User.auth_version + 1
+        db_obj = super().update_by_id(db, id=id, obj_in=update_data)
+        auth_cache.invalidate_user(id)
+        return db_obj
+
+    async def aupdate_by_id(
+        self, db: Session, *, id: int, obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> Optional[User]:
+        """Like update_by_id, but hashes a new password as acreate does"""
+        update_data = self._update_values(obj_in)
+        password = update_data.pop("password", None)
+        if password:
+            update_data["hashed_password"] = await password_hasher.ahash(password)
+        return await run_in_threadpool(self.update_by_id, db, id=id, obj_in=update_data)
 
     def authenticate(
         self, db: Session, *, username: str, password: str
@@ -42,10 +95,43 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         user = self.get_by_username(db, username=username)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        valid, new_hash = password_hasher.verify_and_update(
+            password, user.hashed_password
+        )
+        if not valid:
+            return None
+        if new_hash:
+            self._rehash(db, user=user, hashed_password=new_hash)
+        return user
+
+    async def aauthenticate(
+        self, db: Session, *, username: str, password: str
+    ) -> Optional[User]:
+        """
+        Like authenticate, but waits for bcrypt without holding a threadpool
+        thread; only the short queries run in the threadpool.
+        """
+        user = await run_in_threadpool(self.get_by_username, db, username=username)
+        if not user:
+            return None
+        valid, new_hash = await password_hasher.averify_and_update(
+            password, user.hashed_password
+        )
+        if not valid:
             return None
+        if new_hash:
+            await run_in_threadpool(
+                self._rehash, db, user=user, hashed_password=new_hash
+            )
         return user
 
+    def _rehash(self, db: Session, *, user: User, hashed_password: str) -> None:
+        """Store a hash made with the current bcrypt cost"""
+        user.hashed_password = hashed_password
+        db.add(user)
+        db.commit()
+        password_hasher.rehashed += 1
+
     def is_active(self, user: User) -> bool:
         return user.is_active
 
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Key in Connection.info holding the start times of running statements
+STARTED_KEY = "query_started"
+# Distinct parameter sets remembered per statement; a higher
+# SQL_N_PLUS_ONE_THRESHOLD never triggers
+MAX_VARIANTS = 100
+
+
+class StatementKey(NamedTuple):
+    """
+    What makes two executions the same statement: the database they ran on
+    and the SQL text with placeholders, whitespace normalized
+    """
+
+    database: str
+    statement: str
+
+
+class RepeatedStatement(NamedTuple):
+    key: StatementKey
+    # Times run and how many of those had different parameters
+    count: int
+    variants: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.count}x ({self.variants} parameter sets) "
+            f"{self.key.statement[:200]}"
+        )
+
+
+def statement_key(conn, statement: str) -> StatementKey:
+    url = conn.engine.url
+    return StatementKey(
+        f"{url.get_backend_name()}:{url.host or ''}/{url.database or ''}",
+        " ".join(statement.split()),
+    )
+
+
+class QueryStats:
+    """Statements run and time spent in the database for one unit of work"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Statement -> times run
+        self.statements: Counter = Counter()
+        # Statement -> ids of the distinct parameter sets it ran with
+        self.parameters: Dict[StatementKey, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: StatementKey, seconds: float, parameters: Any = None) -> None:
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.statements[key] += 1
+            seen = self.parameters.setdefault(key, set())
+            if len(seen) < MAX_VARIANTS:
+                seen.add(hash(repr(parameters)))
+
+    def repeated(self, threshold: int) -> List[RepeatedStatement]:
+        """
+        Statements run with at least threshold different parameter sets:
+        the same query once per row of an earlier result (N+1). Running the
+        same query with the same parameters again does not count.
+        """
+        if threshold <= 0:
+            return []
+        with self._lock:
+            return [
+                RepeatedStatement(key, count, len(self.parameters[key]))
+                for key, count in self.statements.most_common()
+                if len(self.parameters[key]) >= threshold
+            ]
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+# Process-wide trackers of track_queries()
+_trackers: List[QueryStats] = []
+
+
+def _tracking() -> bool:
+    return _request_stats.get() is not None or bool(_trackers)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Statements outside a tracked request or track_queries() cost nothing
+    if _tracking():
+        conn.info.setdefault(STARTED_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get(STARTED_KEY)
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _request_stats.get()
+    if stats is None and not _trackers:
+        return
+    key = statement_key(conn, statement)
+    # A batch is one round trip, not a query per row
+    if executemany:
+        parameters = None
+    if stats is not None:
+        stats.record(key, elapsed, parameters)
+    for tracker in _trackers:
+        tracker.record(key, elapsed, parameters)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(STARTED_KEY):
+        connection.info[STARTED_KEY].pop()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Count every statement the process runs inside the block, on any thread
+    or event loop, e.g. around a TestClient call.
+    """
+    stats = QueryStats()
+    _trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _trackers.remove(stats)
+
+
+@contextmanager
+def assert_query_budget(
+    max_queries: int, allow_repeated: bool = False
+) -> Iterator[QueryStats]:
+    """
+    Fail if the block runs more than max_queries statements, or, unless
+    allow_repeated, any statement with SQL_N_PLUS_ONE_THRESHOLD different
+    parameter sets.
+
+        with assert_query_budget(2):
+            client.get("/api/v1/meals/", headers=auth)
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise AssertionError(
+            f"{stats.count} queries, budget is {max_queries}:\n"
+            + "\n".join(
+                f"{count}x {key.statement}"
+                for key, count in stats.statements.most_common()
+            )
+        )
+    repeated = stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD)
+    if repeated and not allow_repeated:
+        raise AssertionError(
+            "Repeated statements (N+1):\n"
+            + "\n".join(str(statement) for statement in repeated)
+        )
+
+
+class QueryStatsMiddleware:
+    """
+    Counts the queries and database time of each HTTP request, logs likely
+    N+1 patterns and, with SQL_DEBUG_HEADERS, returns the counts in X-DB-*
+    response headers. Installed only with SQL_QUERY_STATS or
+    SQL_DEBUG_HEADERS.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_stats(message: Message) -> None:
+            if message["type"] == "http.response.start" and settings.SQL_DEBUG_HEADERS:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["X-DB-Query-Time-Ms"] = f"{stats.seconds * 1000:.2f}"
+                headers["X-DB-Repeated-Statements"] = str(
+                    len(stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD))
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _request_stats.reset(token)
+            for statement in stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD):
+                logger.warning(
+                    f"Possible N+1 in {scope['method']} {scope['path']}: {statement}"
+                )
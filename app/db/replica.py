@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import is_write_statement, replica_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds of replay lag on a Postgres standby. A standby that has replayed
+# everything it received counts as current even if the primary was idle.
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """)
+
+# Keys in Session.info: the user a session works for, and whether the
+# current transaction flushed any change
+USER_KEY = "user_id"
+WROTE_KEY = "wrote"
+
+
+class ReplicaRouter:
+    """
+    Decides whether a read-only request may use the replica.
+
+    The replica is used only while its last health check succeeded and its
+    lag was within max_lag. Users who committed a write in this worker
+    within max_lag keep reading from the primary, so they see their own
+    changes.
+    """
+
+    def __init__(
+        self,
+        replica: Optional[Engine],
+        max_lag: float,
+        check_interval: float,
+        remember: int = 10000,
+    ):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self._checked_at = float("-inf")
+        self._remember = remember
+        self._writes: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record_write(self, user_id: int) -> None:
+        with self._lock:
+            self._writes[user_id] = time.monotonic()
+            self._writes.move_to_end(user_id)
+            if len(self._writes) > self._remember:
+                self._writes.popitem(last=False)
+
+    def wrote_recently(self, user_id: Optional[int]) -> bool:
+        written_at = self._writes.get(user_id)
+        return written_at is not None and time.monotonic() - written_at < self.max_lag
+
+    def use_replica(self, user_id: Optional[int] = None) -> bool:
+        if self.replica is None:
+            return False
+        if self.wrote_recently(user_id):
+            self.primary_reads += 1
+            return False
+        if not self._replica_ok():
+            self.fallbacks += 1
+            self.primary_reads += 1
+            return False
+        self.replica_reads += 1
+        return True
+
+    def mark_unavailable(self) -> None:
+        """Stop using the replica until the next health check"""
+        self.healthy = False
+        self._checked_at = time.monotonic()
+
+    def _replica_ok(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._check()
+        return self.healthy
+
+    def _check(self) -> None:
+        try:
+            with self.replica.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    self.lag = float(connection.execute(LAG_QUERY).scalar() or 0)
+                else:
+                    connection.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except Exception as e:
+            logger.warning(f"Read replica unavailable, using the primary: {e}")
+            self.lag = None
+            self.healthy = False
+            return
+        self.healthy = self.lag <= self.max_lag
+        if not self.healthy:
+            logger.warning(
+                f"Read replica lags {self.lag:.1f}s, using the primary until it "
+                f"is within {self.max_lag:.1f}s"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.replica is not None,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "replica_reads_total": self.replica_reads,
+            "primary_reads_total": self.primary_reads,
+            "fallbacks_total": self.fallbacks,
+        }
+
+
+replica_router = ReplicaRouter(
+    replica_engine, settings.DB_REPLICA_MAX_LAG, settings.DB_REPLICA_CHECK_INTERVAL
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_written(session: Session, flush_context) -> None:
+    session.info[WROTE_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_written(orm_execute_state) -> None:
+    if is_write_statement(orm_execute_state):
+        orm_execute_state.session.info[WROTE_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_write(session: Session) -> None:
+    user_id = session.info.get(USER_KEY)
+    if session.info.pop(WROTE_KEY, False) and user_id is not None:
+        replica_router.record_write(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_write(session: Session, previous_transaction) -> None:
+    session.info.pop(WROTE_KEY, None)
@@ -1,7 +1,370 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.core.config import settings
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+# Async drivers used for the async engine, by sync driver URL prefix
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+class PoolMetrics:
+    """Counters for connection checkouts of one engine"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.overflow_connections = 0
+        self.connects = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, waited: float, overflowed: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            # Anything slower than a millisecond had to wait for a connection
+            if waited > 0.001:
+                self.waits += 1
+            if overflowed:
+                self.overflow_connections += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+
+pool_metrics = PoolMetrics()
+replica_pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+class InstrumentedPoolMixin:
+    """Measures how long checkouts wait for a connection"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        overflow = self._overflow
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(
+            time.perf_counter() - started,
+            self._overflow > overflow and self._overflow > 0,
+        )
+        return record
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    metrics = pool_metrics
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
+
+
+class SessionMetrics:
+    """Counts request sessions and how many of them were never used"""
+
+    def __init__(self):
+        self.requested = 0
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requested += 1
+
+    def record_open(self) -> None:
+        with self._lock:
+            self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requested_total": self.requested,
+            "opened_total": self.opened,
+            "unused_total": self.requested - self.opened,
+        }
+
+
+session_metrics = SessionMetrics()
+
+
+class LazySession:
+    """
+    Stands in for a Session and creates it on first use.
+
+    Requests answered from a cache or rejected before they query anything
+    never build a session. info can be written before that; it is copied
+    into the session when it is created. close() is safe either way.
+    """
+
+    def __init__(self, factory: Callable[[], Session]):
+        self._factory = factory
+        self._session: Optional[Session] = None
+        self._info: Dict[Any, Any] = {}
+        session_metrics.record_request()
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            self._session = self._factory()
+            self._session.info.update(self._info)
+            session_metrics.record_open()
+        return self._session
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    @property
+    def info(self) -> Dict[Any, Any]:
+        return self._info if self._session is None else self._session.info
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+
+def is_write_statement(orm_execute_state: ORMExecuteState) -> bool:
+    """Whether a Session.execute() call runs an INSERT, UPDATE or DELETE"""
+    return (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    )
+
+
+def _engine_options(url: URL, poolclass) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {
+                    "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)
+                }
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+            }
+    if url.get_backend_name() == "sqlite":
+        # Connections move between threadpool threads
+        options["connect_args"] = {"check_same_thread": False}
+        if is_memory_database(url):
+            # A shared in-memory database is gone once its last connection
+            # closes, so pooled connections are never recycled
+            options["pool_recycle"] = -1
+    return options
+
+
+def is_memory_database(url: URL) -> bool:
+    database = url.database or ""
+    return database in ("", ":memory:") or "mode=memory" in str(url)
+
+
+def _sqlite_pragmas(sync_engine: Engine, url: URL) -> None:
+    """
+    Per-connection SQLite settings: WAL lets readers run alongside the
+    writer, synchronous=NORMAL is durable enough with WAL, and busy_timeout
+    makes writers wait for the lock instead of failing right away.
+    """
+    pragmas = [
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        # 64 MiB page cache per connection
+        "PRAGMA cache_size=-65536",
+    ]
+    if not is_memory_database(url):
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def _count_connections(sync_engine: Engine, metrics: PoolMetrics) -> None:
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+
+def create_db_engine(
+    database_uri: Optional[str] = None,
+    metrics: PoolMetrics = pool_metrics,
+    **kwargs: Any,
+) -> Engine:
+    """
+    The one place engines are created, configured from the DB_* settings.
+
+    Engines other than the primary pass their own metrics. Keyword arguments
+    override the defaults, e.g. a different pool class.
+    """
+    url = make_url(database_uri or settings.SQLALCHEMY_DATABASE_URI)
+    poolclass = InstrumentedQueuePool
+    if metrics is not pool_metrics:
+        poolclass = type(poolclass.__name__, (poolclass,), {"metrics": metrics})
+    options = _engine_options(url, poolclass)
+    options.update(kwargs)
+    new_engine = create_engine(url, **options)
+    _count_connections(new_engine, metrics)
+    if url.get_backend_name() == "sqlite":
+        _sqlite_pragmas(new_engine, url)
+    return new_engine
+
+
+def async_database_uri(database_uri: str) -> URL:
+    """The same database, addressed through its async driver"""
+    url = make_url(database_uri)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.drivername}")
+    return url.set(drivername=driver)
+
+
+def create_async_db_engine(database_uri: Optional[str] = None, **kwargs: Any):
+    """Async counterpart of create_db_engine, using asyncpg or aiosqlite"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_database_uri(database_uri or settings.SQLALCHEMY_DATABASE_URI)
+    options = _engine_options(url, InstrumentedAsyncQueuePool)
+    options.update(kwargs)
+    new_engine = create_async_engine(url, **options)
+    _count_connections(new_engine.sync_engine, async_pool_metrics)
+    if url.get_backend_name() == "sqlite":
+        _sqlite_pragmas(new_engine.sync_engine, url)
+    return new_engine
+
+
+def _pool_stats(pool, metrics: PoolMetrics) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            }
+        )
+    stats.update(
+        {
+            "checkouts_total": metrics.checkouts,
+            "waits_total": metrics.waits,
+            "wait_seconds_total": round(metrics.wait_seconds, 6),
+            "wait_seconds_max": round(metrics.max_wait_seconds, 6),
+            "timeouts_total": metrics.timeouts,
+            "overflow_connections_total": metrics.overflow_connections,
+            "connects_total": metrics.connects,
+            "invalidations_total": metrics.invalidations,
+        }
+    )
+    return stats
+
+
+def pool_stats(db_engine: Optional[Engine] = None) -> Dict[str, Any]:
+    stats = _pool_stats((db_engine or engine).pool, pool_metrics)
+    stats["replica_pool"] = (
+        _pool_stats(replica_engine.pool, replica_pool_metrics)
+        if replica_engine is not None
+        else None
+    )
+    stats["async_pool"] = (
+        _pool_stats(_async_engine.pool, async_pool_metrics)
+        if _async_engine is not None
+        else None
+    )
+    return stats
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Optional read replica for read-only dependencies, see app.db.replica
+replica_engine = (
+    create_db_engine(settings.SQLALCHEMY_REPLICA_URI, replica_pool_metrics)
+    if settings.SQLALCHEMY_REPLICA_URI
+    else None
+)
+ReplicaSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    if replica_engine is not None
+    else None
+)
+
+# Created on first use, so processes that never touch the async stack do not
+# need the async driver
+_async_engine = None
+_async_session_factory = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine():
+    global _async_engine
+    with _async_lock:
+        if _async_engine is None:
+            _async_engine = create_async_db_engine()
+        return _async_engine
+
+
+def AsyncSessionLocal():
+    """A new AsyncSession, the async counterpart of SessionLocal()"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async_engine = get_async_engine()
+        with _async_lock:
+            if _async_session_factory is None:
+                # Objects stay usable after commit; async sessions cannot
+                # lazily reload expired attributes
+                _async_session_factory = async_sessionmaker(
+                    async_engine, autoflush=False, expire_on_commit=False
+                )
+    return _async_session_factory()
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_session_factory
+    with _async_lock:
+        async_engine, _async_engine = _async_engine, None
+        _async_session_factory = None
+    if async_engine is not None:
+        await async_engine.dispose()
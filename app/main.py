@@ -1,16 +1,23 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from starlette.middleware.base import BaseHTTPMiddleware
 import logging
-import time
 from typing import Callable
 import asyncio
 from contextlib import asynccontextmanager
 
 from app.api.api import api_router
+from app.api.endpoints.metrics import router as metrics_router
+from app.api.pagination import NEXT_CURSOR_HEADER
+from app.core.access_log import AccessLogMiddleware, access_log
 from app.core.config import settings
-from app.api.websockets import start_background_tasks
+from app.core.events import bus
+from app.core.metrics import MetricsMiddleware
+from app.core.password_hasher import PasswordHasherBusy, password_hasher
+from app.db.query_stats import QueryStatsMiddleware
+from app.db.session import dispose_async_engine
+from app.api.websockets import start_background_tasks, stop_background_tasks
 
 # Configure logging
 logging.basicConfig(
@@ -20,22 +27,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        logger.info(
-            f"{request.method} {request.url.path} - {response.status_code} - {process_time:.4f}s"
-        )
-        return response
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Access log lines are written by a background thread from here on
+    access_log.start()
+    # Domain events from the CRUD layer are dispatched off the request path
+    await bus.start()
     # Start background tasks for WebSocket notifications
     await start_background_tasks()
     yield
+    await stop_background_tasks()
+    await bus.stop()
+    password_hasher.shutdown()
+    await dispose_async_engine()
+    access_log.stop()
 
 
 app = FastAPI(
@@ -52,13 +57,32 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
-# Add logging middleware
-app.add_middleware(LoggingMiddleware)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password operations in progress, try again"},
+        headers={"Retry-After": "1"},
+    )
+
+
+# Access log, sampled and written off the event loop, see app.core.access_log
+app.add_middleware(AccessLogMiddleware)
+# Query counts and N+1 warnings per request, see app.db.query_stats
+if settings.SQL_QUERY_STATS or settings.SQL_DEBUG_HEADERS:
+    app.add_middleware(QueryStatsMiddleware)
+# Outermost, so latency includes the other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -67,4 +91,10 @@ def root():
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    uvicorn.run(
+        "main:app",
+        host="127.0.0.1",
+        port=8000,
+        reload=True,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+    )
@@ -5,6 +5,7 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -38,6 +39,8 @@ class User(Base):
     full_name = Column(String)
     role = Column(Enum(UserRole), default=UserRole.chef)
     is_active = Column(Boolean, default=True)
+    # Bumped whenever cached principals of this user become stale
+    auth_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -68,6 +71,9 @@ class Ingredient(Base):
 
 class IngredientDelivery(Base):
     __tablename__ = "ingredient_deliveries"
+    __table_args__ = (
+        Index("ix_ingredient_deliveries_ingredient_id_id", "ingredient_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     ingredient_id = Column(Integer, ForeignKey("ingredients.id"), nullable=False)
@@ -120,6 +126,11 @@ class MealIngredient(Base):
 
 class MealServing(Base):
     __tablename__ = "meal_servings"
+    # Keyset pagination of servings per meal and per user
+    __table_args__ = (
+        Index("ix_meal_servings_meal_id_id", "meal_id", "id"),
+        Index("ix_meal_servings_served_by_id", "served_by", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     meal_id = Column(Integer, ForeignKey("meals.id"), nullable=False)
@@ -153,6 +164,7 @@ class MonthlyReport(Base):
 
 class Alert(Base):
     __tablename__ = "alerts"
+    __table_args__ = (Index("ix_alerts_is_read_id", "is_read", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     message = Column(String, nullable=False)
@@ -167,6 +179,15 @@ class Alert(Base):
     related_report = relationship("MonthlyReport", back_populates="alerts")
 
 
+class RealtimeEvent(Base):
+    __tablename__ = "realtime_events"
+
+    # The id doubles as the sequence number of the real-time event
+    id = Column(Integer, primary_key=True, index=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Roles(Base):
     __tablename__ = "roles"
 
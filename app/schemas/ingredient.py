@@ -1,6 +1,6 @@
 from typing import List, Optional
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, AliasPath, BaseModel, Field
 
 
 # Shared properties
@@ -22,6 +22,11 @@ class IngredientUpdate(BaseModel):
     min_quantity: Optional[float] = Field(default=None, ge=0.0)
 
 
+# One item of a bulk update
+class IngredientBulkUpdate(IngredientUpdate):
+    id: int
+
+
 # Properties shared by models stored in DB
 class IngredientInDBBase(IngredientBase):
     id: int
@@ -102,6 +107,10 @@ class MealIngredientInDBBase(MealIngredientBase):
     meal_id: int
     created_at: datetime
     updated_at: datetime
+    # Filled from the loaded ingredient relationship
+    ingredient_name: Optional[str] = Field(
+        default=None, validation_alias=AliasPath("ingredient", "name")
+    )
 
     class Config:
         from_attributes = True
@@ -135,6 +144,13 @@ class MealUpdate(BaseModel):
     ingredients: Optional[List[MealIngredientCreate]] = None
 
 
+# One item of a bulk update; ingredients are changed one meal at a time
+class MealBulkUpdate(BaseModel):
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+
 # Properties shared by models stored in DB
 class MealInDBBase(MealBase):
     id: int
@@ -148,7 +164,10 @@ class MealInDBBase(MealBase):
 
 # Properties to return to client
 class Meal(MealInDBBase):
-    ingredients: List[MealIngredient] = []
+    # The ORM relationship is Meal.meal_ingredients
+    ingredients: List[MealIngredient] = Field(
+        default=[], validation_alias=AliasChoices("ingredients", "meal_ingredients")
+    )
 
 
 # Properties stored in DB
@@ -0,0 +1,113 @@
+"""
+Benchmark: read throughput of sync vs async database sessions.
+
+Simulates many concurrent read-heavy requests (list ingredients, then load
+one by id). Sync handlers run the way FastAPI runs ``def`` endpoints: in the
+shared threadpool of 40 threads. Async handlers run on the event loop with
+AsyncSession. Uses SQLALCHEMY_DATABASE_URI, so point it at a migrated
+database; --seed adds ingredients if the table has fewer rows.
+
+Usage:
+    python benchmarks/db_sync_vs_async.py [--requests 5000] [--concurrency 200]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import anyio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.crud.crud_ingredient import ingredient
+from app.db.session import AsyncSessionLocal, SessionLocal, dispose_async_engine
+from app.models.models import Ingredient
+
+# Starlette's default threadpool size for sync endpoints
+THREADPOOL_SIZE = 40
+
+
+def seed(rows: int) -> None:
+    db = SessionLocal()
+    try:
+        existing = db.query(Ingredient).count()
+        db.add_all(
+            Ingredient(name=f"bench-{i}", quantity=1000, min_quantity=10)
+            for i in range(existing, rows)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def sync_handler(ingredient_id: int) -> int:
+    db = SessionLocal()
+    try:
+        rows = ingredient.get_multi(db, limit=100)
+        ingredient.get(db, id=ingredient_id)
+        return len(rows)
+    finally:
+        db.close()
+
+
+async def async_handler(ingredient_id: int) -> int:
+    async with AsyncSessionLocal() as db:
+        rows = await ingredient.aget_multi(db, limit=100)
+        await ingredient.aget(db, id=ingredient_id)
+        return len(rows)
+
+
+async def run(name: str, call, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(i % 100 + 1)
+            latencies.append(time.perf_counter() - started)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{name:<6} {requests / elapsed:8.0f} req/s  "
+        f"p50={p50:7.2f}ms p99={p99:7.2f}ms"
+    )
+
+
+async def main_async(args) -> None:
+    limiter = anyio.CapacityLimiter(THREADPOOL_SIZE)
+
+    async def sync_call(ingredient_id: int):
+        return await anyio.to_thread.run_sync(
+            sync_handler, ingredient_id, limiter=limiter
+        )
+
+    # Warm both pools before measuring
+    await run("warmup", sync_call, 100, 10)
+    await run("warmup", async_handler, 100, 10)
+    await run("sync", sync_call, args.requests, args.concurrency)
+    await run("async", async_handler, args.requests, args.concurrency)
+    await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=100)
+    args = parser.parse_args()
+
+    seed(args.seed)
+    print(f"{args.requests} requests, {args.concurrency} concurrent")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: encoding large list responses.
+
+Loads --rows ingredients, meal servings and meals (with their ingredient
+lines) from an in-memory SQLite database and times turning them into the
+response body three ways: what FastAPI does with a response_model
+(validate every row from attributes, then dump JSON), the jsonable_encoder
+path of older FastAPI releases, and RowSerializer, which reads the ORM rows
+without validation and encodes with orjson when installed.
+
+Usage:
+    python benchmarks/json_responses.py [--rows 10000] [--rounds 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import serialization
+from app.api.serialization import RowSerializer
+from app.crud.crud_ingredient import ingredient
+from app.crud.crud_meal import meal
+from app.crud.crud_meal_serving import meal_serving
+from app.db.base_class import Base
+from app.models import models
+from app.schemas.ingredient import Ingredient, Meal
+from app.schemas.meal_serving import MealServing
+
+
+def seed(db, rows: int) -> None:
+    user = models.User(
+        username="bench",
+        email="bench@example.com",
+        hashed_password="-",
+        full_name="Bench",
+        role="admin",
+    )
+    db.add(user)
+    db.flush()
+    ingredients = [
+        models.Ingredient(name=f"bench-{i}", quantity=1000.5, min_quantity=10)
+        for i in range(rows)
+    ]
+    db.add_all(ingredients)
+    db.flush()
+    meals = []
+    for i in range(rows):
+        new_meal = models.Meal(
+            name=f"meal-{i}", description="Bench", created_by=user.id
+        )
+        new_meal.meal_ingredients = [
+            models.MealIngredient(
+                ingredient_id=ingredients[(i + j) % rows].id, quantity=50
+            )
+            for j in range(3)
+        ]
+        meals.append(new_meal)
+    db.add_all(meals)
+    db.flush()
+    now = datetime.now()
+    db.add_all(
+        models.MealServing(
+            meal_id=meals[i].id, portions=2, served_by=user.id, served_at=now
+        )
+        for i in range(rows)
+    )
+    db.commit()
+
+
+def measure(name: str, encode, rounds: int) -> float:
+    body = encode()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    print(f"  {name:<26} {elapsed:8.1f} ms  {len(body) / 1024:8.0f} KiB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.rows)
+
+    encoder = "orjson" if serialization.orjson is not None else "pydantic_core"
+    print(f"{args.rows} rows, RowSerializer encodes with {encoder}")
+    for schema, crud in (
+        (Ingredient, ingredient),
+        (MealServing, meal_serving),
+        (Meal, meal),
+    ):
+        db.expunge_all()
+        rows = crud.get_multi(db, limit=args.rows)
+        adapter = TypeAdapter(List[schema])
+        serializer = RowSerializer(schema)
+
+        print(schema.__name__)
+        validated = measure(
+            "response_model",
+            lambda: adapter.dump_json(
+                adapter.validate_python(rows, from_attributes=True)
+            ),
+            args.rounds,
+        )
+        measure(
+            "jsonable_encoder",
+            lambda: json.dumps(
+                jsonable_encoder(adapter.validate_python(rows, from_attributes=True))
+            ).encode(),
+            args.rounds,
+        )
+        fast = measure(
+            "RowSerializer",
+            lambda: serialization.dumps(serializer.dump(rows)),
+            args.rounds,
+        )
+        print(f"  {'speedup over response_model':<26} {validated / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
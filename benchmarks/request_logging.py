@@ -0,0 +1,127 @@
+"""
+Benchmark: per-request overhead of access logging.
+
+Runs a minimal ASGI app behind each logging setup and reports the time per
+request: no logging, the former BaseHTTPMiddleware that formatted and wrote
+every line in the request, and AccessLogMiddleware writing directly, through
+the queue, sampled and slow-only. Log lines go to os.devnull with the
+application's format.
+
+Usage:
+    python benchmarks/request_logging.py [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.access_log import AccessLogMiddleware, access_log
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "path": "/api/v1/ingredients/42",
+    "raw_path": b"/api/v1/ingredients/42",
+    "query_string": b"",
+    "headers": [(b"host", b"localhost")],
+    "scheme": "http",
+    "server": ("localhost", 8000),
+    "client": ("127.0.0.1", 50000),
+    "root_path": "",
+}
+BODY = b'{"id":42,"name":"Guruch","quantity":12.5}'
+
+
+async def endpoint(scope, receive, send):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": BODY})
+
+
+class FormerLoggingMiddleware(BaseHTTPMiddleware):
+    """The access log as it was before AccessLogMiddleware"""
+
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        logging.getLogger("app.main").info(
+            f"{request.method} {request.url.path} - {response.status_code} - {process_time:.4f}s"
+        )
+        return response
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, requests: int) -> float:
+    for _ in range(min(requests, 500)):
+        await app(dict(SCOPE), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def run(requests: int):
+    setups = [
+        ("no logging", endpoint, False),
+        ("BaseHTTPMiddleware, sync", FormerLoggingMiddleware(endpoint), False),
+        ("pure ASGI, sync", AccessLogMiddleware(endpoint, sample_rate=1.0), False),
+        ("pure ASGI, queue", AccessLogMiddleware(endpoint, sample_rate=1.0), True),
+        (
+            "pure ASGI, queue, 10% sampled",
+            AccessLogMiddleware(endpoint, sample_rate=0.1),
+            True,
+        ),
+        ("pure ASGI, slow only", AccessLogMiddleware(endpoint, slow_only=True), True),
+    ]
+    baseline = None
+    print(f"{'setup':32} {'us/request':>11} {'overhead':>9}")
+    for name, app, queued in setups:
+        if queued:
+            access_log.start()
+        try:
+            per_request = await measure(app, requests)
+        finally:
+            access_log.stop()
+        if baseline is None:
+            baseline = per_request
+        print(f"{name:32} {per_request:11.1f} {per_request - baseline:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
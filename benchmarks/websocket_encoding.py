@@ -0,0 +1,96 @@
+"""
+Benchmark: bytes and CPU per broadcast for each WebSocket encoding.
+
+For every message shape the script reports the frame size for JSON and
+MessagePack, with and without permessage-deflate (raw DEFLATE, as the
+extension sends it), and the encode time per broadcast. The frame is
+encoded once per broadcast; deflate runs once per connection.
+
+Usage:
+    python benchmarks/websocket_encoding.py [--items 15] [--rounds 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.ws_encoding import Frame, available_encodings
+
+
+def messages(items: int):
+    timestamp = datetime.now().isoformat()
+    yield "inventory_batch", {
+        "type": "inventory_batch",
+        "data": {
+            "items": [
+                {
+                    "ingredient_id": i,
+                    "ingredient_name": f"Ingredient {i}",
+                    "quantity": 12345.5 - i,
+                }
+                for i in range(items)
+            ],
+            "timestamp": timestamp,
+        },
+    }
+    yield "alert", {
+        "type": "alert",
+        "data": {
+            "alert_type": "ingredient_low",
+            "message": "Low stock alert: Guruch is below minimum quantity",
+            "timestamp": timestamp,
+            "related_id": 7,
+        },
+    }
+
+
+def deflate(data) -> bytes:
+    if isinstance(data, str):
+        data = data.encode()
+    compressor = zlib.compressobj(wbits=-15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)[:-4]
+
+
+def measure(payload, encoding: str, rounds: int):
+    start = time.process_time()
+    for _ in range(rounds):
+        data = Frame(payload).encode(encoding)
+    encode_us = (time.process_time() - start) / rounds * 1e6
+
+    start = time.process_time()
+    for _ in range(rounds):
+        compressed = deflate(data)
+    deflate_us = (time.process_time() - start) / rounds * 1e6
+
+    size = len(data.encode() if isinstance(data, str) else data)
+    return size, len(compressed), encode_us, deflate_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=15)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{'message':<16} {'encoding':<9} {'bytes':>7} {'deflated':>9} "
+        f"{'encode us':>10} {'deflate us':>11}"
+    )
+    for name, payload in messages(args.items):
+        for encoding in available_encodings():
+            size, compressed, encode_us, deflate_us = measure(
+                payload, encoding, args.rounds
+            )
+            print(
+                f"{name:<16} {encoding:<9} {size:>7} {compressed:>9} "
+                f"{encode_us:>10.1f} {deflate_us:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
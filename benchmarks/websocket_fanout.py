@@ -0,0 +1,97 @@
+"""
+Benchmark: WebSocket broadcast to thousands of simulated clients.
+
+Compares the old sequential ``await send_text`` loop with the per-connection
+queue fan-out of ``ConnectionManager``. A small share of clients is slow
+(simulating tablets on bad Wi-Fi); the interesting number is how long the
+fast clients wait for a message.
+
+Usage:
+    python benchmarks/websocket_fanout.py [--clients 5000] [--slow 0.01]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.websockets import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.received = asyncio.Event()
+        self.received_at = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.received_at is None:
+            self.received_at = time.perf_counter()
+        self.received.set()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_clients(count: int, slow_share: float, slow_delay: float):
+    slow_every = int(1 / slow_share) if slow_share else 0
+    return [
+        FakeWebSocket(slow_delay if slow_every and i % slow_every == 0 else 0.0)
+        for i in range(count)
+    ]
+
+
+def report(name: str, clients, start: float):
+    fast = [c.received_at - start for c in clients if not c.delay]
+    fast.sort()
+    p50 = fast[len(fast) // 2] * 1000
+    p99 = fast[int(len(fast) * 0.99) - 1] * 1000
+    print(f"{name:<12} fast clients p50={p50:8.2f}ms p99={p99:8.2f}ms")
+
+
+async def sequential(clients):
+    start = time.perf_counter()
+    for client in clients:
+        await client.send_text("{}")
+    report("sequential", clients, start)
+
+
+async def fanout(clients):
+    manager = ConnectionManager()
+    for i, client in enumerate(clients):
+        await manager.connect(client, str(i), "chef")
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await manager.broadcast("{}")
+    await asyncio.gather(*(c.received.wait() for c in clients if not c.delay))
+    report("fan-out", clients, start)
+    print(f"{'':<12} {manager.stats()}")
+    # Let the senders finish so asyncio.run has no tasks left to cancel
+    await manager.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--slow", type=float, default=0.01)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(
+        f"{args.clients} clients, {args.slow:.0%} slow ({args.slow_delay * 1000:.0f}ms per send)"
+    )
+    asyncio.run(sequential(make_clients(args.clients, args.slow, args.slow_delay)))
+    asyncio.run(fanout(make_clients(args.clients, args.slow, args.slow_delay)))
+
+
+if __name__ == "__main__":
+    main()
@@ -33,4 +33,4 @@ print('Admin user created successfully')
 
 # Start the application
 #cd /home/ubuntu/kindergarten_kitchen_system
-uvicorn app.main:app --host 127.0.0.1 --port 8000
+uvicorn app.main:app --host 127.0.0.1 --port 8000 --ws-per-message-deflate "${WS_PER_MESSAGE_DEFLATE:-True}"
@@ -0,0 +1,59 @@
+import os
+
+# Settings are read when app.core.config is imported, so configure first:
+# an in-memory SQLite database and no auth version checks between requests
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = ":memory:"
+os.environ["AUTH_CACHE_VERSION_INTERVAL"] = "3600"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.auth_cache import auth_cache
+from app.core.security import create_access_token
+from app.db.base_class import Base
+from app.db.session import SessionLocal, engine
+from app.main import app
+from app.models import models
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+    auth_cache.clear()
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def admin(db):
+    user = models.User(
+        username="admin",
+        email="admin@example.com",
+        hashed_password="-",
+        full_name="Admin",
+        role=models.UserRole.admin,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def admin_headers(admin):
+    return {"Authorization": f"Bearer {create_access_token(admin.id)}"}
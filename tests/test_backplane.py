@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from app.api.websockets import ConnectionManager
+from app.core.backplane import MAX_PAYLOAD_BYTES, PostgresBackplane
+
+
+def make_backplane():
+    backplane = PostgresBackplane("postgresql://localhost/kitchen", "kitchen_events")
+    # Publishing only needs the outbox; start() would also connect
+    backplane._outbox = asyncio.Queue()
+    return backplane
+
+
+def sent(backplane):
+    bodies = []
+    while not backplane._outbox.empty():
+        bodies.append(backplane._outbox.get_nowait())
+    return bodies
+
+
+def test_large_batch_is_relayed_in_parts():
+    async def run():
+        sender, receiver = ConnectionManager(), ConnectionManager()
+        sender.attach_backplane(make_backplane())
+        receiver.attach_backplane(make_backplane())
+        delivered = []
+        receiver.deliver_batch = delivered.append
+
+        batch = {
+            "kind": "batch",
+            "type": "inventory_batch",
+            "wildcard": "ingredients",
+            "items": [
+                [
+                    f"ingredient:{i}",
+                    {
+                        "ingredient_id": i,
+                        "ingredient_name": f"Ingredient {i}",
+                        "quantity": 1.5,
+                    },
+                ]
+                for i in range(500)
+            ],
+            "timestamp": "2026-10-19T12:00:00",
+        }
+        sender.relay_batch(batch)
+        bodies = sent(sender.backplane)
+        assert len(bodies) > 1
+        assert all(len(body.encode()) <= MAX_PAYLOAD_BYTES for body in bodies)
+
+        # Parts may arrive in any order and more than once
+        for body in reversed(bodies + bodies[:1]):
+            await receiver.backplane._dispatch(body)
+        return delivered, json.loads(json.dumps(batch))
+
+    delivered, batch = asyncio.run(run())
+    assert len(delivered) == 1
+    assert delivered[0]["items"] == batch["items"]
+
+
+def test_own_parts_are_ignored():
+    async def run():
+        backplane = make_backplane()
+        received = []
+
+        async def handler(payload):
+            received.append(payload)
+
+        backplane.register("ws", handler)
+        backplane.publish("ws", {"message": "x" * 20000})
+        for body in sent(backplane):
+            await backplane._dispatch(body)
+        return received
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.core.events import DeliveryReceived, bus
+from app.crud.crud_ingredient import ingredient, ingredient_delivery
+from app.models import models
+from app.schemas.ingredient import IngredientDeliveryCreate
+
+
+def test_upsert_updates_existing_and_creates_new(client, db, admin_headers):
+    client.post(
+        "/api/v1/ingredients/bulk",
+        json=[{"name": "rice", "quantity": 100, "min_quantity": 10}],
+        headers=admin_headers,
+    )
+    response = client.put(
+        "/api/v1/ingredients/bulk",
+        json=[
+            {"name": "rice", "quantity": 250, "min_quantity": 10},
+            {"name": "salt", "quantity": 50, "min_quantity": 5},
+        ],
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    quantities = {item["name"]: item["quantity"] for item in response.json()}
+    assert quantities == {"rice": 250, "salt": 50}
+
+
+def test_upsert_integrity_error_is_a_conflict(client, db, admin_headers, monkeypatch):
+    def upsert_many(db, *, objs_in):
+        raise IntegrityError("INSERT", {}, Exception("constraint failed"))
+
+    monkeypatch.setattr(ingredient, "upsert_many", upsert_many)
+    response = client.put(
+        "/api/v1/ingredients/bulk",
+        json=[{"name": "rice", "quantity": 250, "min_quantity": 10}],
+        headers=admin_headers,
+    )
+    assert response.status_code == 409
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+    monkeypatch.setattr(bus, "publish", events.append)
+    return events
+
+
+@pytest.fixture
+def stocked(db):
+    ingredients = [
+        models.Ingredient(name=name, quantity=0, min_quantity=0)
+        for name in ("rice", "salt")
+    ]
+    db.add_all(ingredients)
+    db.commit()
+    return ingredients
+
+
+def add_deliveries(db, admin, stocked):
+    deliveries = [
+        IngredientDeliveryCreate(
+            ingredient_id=stocked[i % 2].id,
+            quantity=i + 1,
+            delivery_date=datetime(2024, 1, 1),
+        )
+        for i in range(5)
+    ]
+    return ingredient_delivery.create_many_with_user(
+        db, objs_in=deliveries, user_id=admin.id
+    )
+
+
+def test_bulk_deliveries_are_published_after_commit(db, admin, stocked, published):
+    created = add_deliveries(db, admin, stocked)
+    received = [event for event in published if isinstance(event, DeliveryReceived)]
+    assert sorted(received, key=lambda event: event.delivery_id) == [
+        DeliveryReceived(
+            delivery_id=delivery.id,
+            ingredient_id=delivery.ingredient_id,
+            quantity=delivery.quantity,
+            created_by=admin.id,
+        )
+        for delivery in created
+    ]
+
+
+def test_rolled_back_bulk_deliveries_publish_nothing(
+    db, admin, stocked, published, monkeypatch
+):
+    def fail_commit():
+        db.rollback()
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", fail_commit)
+    with pytest.raises(RuntimeError):
+        add_deliveries(db, admin, stocked)
+    assert published == []
@@ -0,0 +1,59 @@
+from app.db.query_stats import assert_query_budget
+from app.models import models
+
+# Meals, then their ingredient lines with the ingredients joined in
+MEAL_QUERIES = 2
+
+
+def add_meals(db, user, count, start=0):
+    ingredients = [
+        models.Ingredient(name=f"ingredient-{start + i}", quantity=100, min_quantity=1)
+        for i in range(count)
+    ]
+    db.add_all(ingredients)
+    db.flush()
+    for i in range(count):
+        meal = models.Meal(name=f"meal-{start + i}", created_by=user.id)
+        meal.meal_ingredients = [
+            models.MealIngredient(ingredient_id=ingredient.id, quantity=10)
+            for ingredient in ingredients[i : i + 3]
+        ]
+        db.add(meal)
+    db.commit()
+
+
+def count_queries(client, headers, path):
+    with assert_query_budget(MEAL_QUERIES) as stats:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return stats.count, response.json()
+
+
+def test_meal_list_query_count_is_constant(client, db, admin, admin_headers):
+    add_meals(db, admin, 3)
+    # Caches the user principal, so the requests below only load meals
+    client.get("/api/v1/meals/", headers=admin_headers)
+
+    few, meals = count_queries(client, admin_headers, "/api/v1/meals/")
+    assert len(meals) == 3
+    add_meals(db, admin, 27, start=3)
+    many, meals = count_queries(client, admin_headers, "/api/v1/meals/")
+
+    assert len(meals) == 30
+    assert all(meal["ingredients"] for meal in meals)
+    assert few == many == MEAL_QUERIES
+
+
+def test_meal_detail_query_count_is_constant(client, db, admin, admin_headers):
+    add_meals(db, admin, 30)
+    meal_ids = [meal.id for meal in db.query(models.Meal).all()]
+    client.get(f"/api/v1/meals/{meal_ids[0]}", headers=admin_headers)
+
+    counts = set()
+    for meal_id in (meal_ids[0], meal_ids[2], meal_ids[-1]):
+        count, meal = count_queries(client, admin_headers, f"/api/v1/meals/{meal_id}")
+        assert meal["id"] == meal_id
+        assert meal["ingredients"][0]["ingredient_name"]
+        counts.add(count)
+
+    assert counts == {MEAL_QUERIES}
@@ -0,0 +1,51 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints.metrics import router
+from app.core.config import settings
+from app.core.metrics import Metric
+from app.core.security import create_access_token
+from app.models import models
+
+
+@pytest.fixture
+def metrics_client():
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_metric_requires_samples():
+    with pytest.raises(TypeError):
+        Metric("requests_total", "Requests")
+
+
+def test_metrics_need_credentials(metrics_client):
+    assert metrics_client.get("/metrics").status_code == 401
+
+
+def test_metrics_need_an_admin(metrics_client, db, admin_headers):
+    chef = models.User(
+        username="chef",
+        email="chef@example.com",
+        hashed_password="-",
+        full_name="Chef",
+        role=models.UserRole.chef,
+    )
+    db.add(chef)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(chef.id)}"}
+    assert metrics_client.get("/metrics", headers=headers).status_code == 403
+
+    response = metrics_client.get("/metrics", headers=admin_headers)
+    assert response.status_code == 200
+    assert "# TYPE db_pool_size gauge" in response.text
+
+
+def test_metrics_token(metrics_client, admin_headers, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    headers = {"Authorization": "Bearer scrape-secret"}
+    assert metrics_client.get("/metrics", headers=headers).status_code == 200
+    # The token replaces user tokens
+    assert metrics_client.get("/metrics", headers=admin_headers).status_code == 403
@@ -0,0 +1,130 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.db.query_stats import (
+    STARTED_KEY,
+    QueryStats,
+    QueryStatsMiddleware,
+    StatementKey,
+    assert_query_budget,
+    track_queries,
+)
+
+
+@pytest.fixture
+def sqlite():
+    sqlite_engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    with sqlite_engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO items (id) VALUES (1), (2), (3)"))
+    yield sqlite_engine
+    sqlite_engine.dispose()
+
+
+def run_lookups(sqlite_engine, ids):
+    with sqlite_engine.connect() as connection:
+        for item_id in ids:
+            connection.execute(
+                text("SELECT id FROM items WHERE id = :id"), {"id": item_id}
+            )
+
+
+def test_repeated_counts_parameter_variation():
+    stats = QueryStats()
+    lookup = StatementKey("sqlite:/", "SELECT id FROM items WHERE id = ?")
+    other = StatementKey("sqlite:/other", lookup.statement)
+    for item_id in range(5):
+        stats.record(lookup, 0.001, (item_id,))
+        stats.record(other, 0.001, (1,))
+
+    repeated = stats.repeated(5)
+
+    # Same SQL on another database is another statement, and running it
+    # with the same parameters is not an N+1
+    assert [(r.key, r.count, r.variants) for r in repeated] == [(lookup, 5, 5)]
+    assert stats.repeated(6) == []
+    assert stats.repeated(0) == []
+
+
+def test_track_queries_groups_by_normalized_statement(sqlite):
+    with track_queries() as stats:
+        run_lookups(sqlite, [1, 2])
+        with sqlite.connect() as connection:
+            connection.execute(text("SELECT  id\n FROM items"))
+
+    assert stats.count == 3
+    assert {key.statement: count for key, count in stats.statements.items()} == {
+        "SELECT id FROM items WHERE id = ?": 2,
+        "SELECT id FROM items": 1,
+    }
+
+
+def test_untracked_statements_are_not_timed(sqlite):
+    with sqlite.connect() as connection:
+        connection.execute(text("SELECT id FROM items"))
+        assert STARTED_KEY not in connection.info
+
+
+def test_query_budget_passes_within_budget(sqlite):
+    with assert_query_budget(3) as stats:
+        run_lookups(sqlite, [1, 2, 3])
+    assert stats.count == 3
+
+
+def test_query_budget_fails_over_budget(sqlite):
+    with pytest.raises(AssertionError, match="3 queries, budget is 2"):
+        with assert_query_budget(2):
+            run_lookups(sqlite, [1, 2, 3])
+
+
+def test_query_budget_fails_on_n_plus_one(sqlite, monkeypatch):
+    monkeypatch.setattr(settings, "SQL_N_PLUS_ONE_THRESHOLD", 3)
+    with pytest.raises(AssertionError, match="N\\+1"):
+        with assert_query_budget(10):
+            run_lookups(sqlite, [1, 2, 3])
+
+    with assert_query_budget(10, allow_repeated=True):
+        run_lookups(sqlite, [1, 2, 3])
+    # The same lookup again and again is not an N+1
+    with assert_query_budget(10):
+        run_lookups(sqlite, [1, 1, 1, 1])
+
+
+def lookup_app(sqlite_engine, ids):
+    async def app(scope, receive, send):
+        run_lookups(sqlite_engine, ids)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return TestClient(QueryStatsMiddleware(app))
+
+
+@pytest.mark.parametrize(
+    "ids, warned", [([1, 2, 3, 4, 5], True), ([1, 2, 3, 4], False)]
+)
+def test_middleware_warns_at_threshold(sqlite, monkeypatch, caplog, ids, warned):
+    monkeypatch.setattr(settings, "SQL_N_PLUS_ONE_THRESHOLD", 5)
+    monkeypatch.setattr(settings, "SQL_DEBUG_HEADERS", True)
+    caplog.set_level(logging.WARNING, logger="app.db.query_stats")
+
+    response = lookup_app(sqlite, ids).get("/items")
+
+    assert response.headers["X-DB-Query-Count"] == str(len(ids))
+    assert response.headers["X-DB-Repeated-Statements"] == str(int(warned))
+    messages = [record.getMessage() for record in caplog.records]
+    if warned:
+        assert messages == [
+            "Possible N+1 in GET /items: 5x (5 parameter sets) "
+            "SELECT id FROM items WHERE id = ?"
+        ]
+    else:
+        assert messages == []
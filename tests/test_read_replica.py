@@ -0,0 +1,33 @@
+from sqlalchemy.exc import OperationalError
+
+from app.api import deps
+from app.db.replica import replica_router
+
+
+class DownReplicaSession:
+    closed = False
+
+    def connection(self):
+        raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    def close(self):
+        self.closed = True
+
+
+def test_read_falls_back_to_primary_when_replica_is_down(
+    client, admin_headers, monkeypatch
+):
+    replicas = []
+
+    def replica_session():
+        replicas.append(DownReplicaSession())
+        return replicas[-1]
+
+    monkeypatch.setattr(deps, "ReplicaSessionLocal", replica_session)
+    monkeypatch.setattr(replica_router, "use_replica", lambda user_id: True)
+    monkeypatch.setattr(replica_router, "healthy", True)
+
+    response = client.get("/api/v1/meals/", headers=admin_headers)
+    assert response.status_code == 200
+    assert replicas and replicas[0].closed
+    assert not replica_router.healthy
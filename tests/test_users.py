@@ -0,0 +1,46 @@
+from app.core.password_hasher import password_hasher
+from app.core import security
+from app.models import models
+
+
+def test_read_users_me_from_principal(client, admin, admin_headers):
+    response = client.get("/api/v1/users/users/me", headers=admin_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["id"] == admin.id
+    assert body["username"] == "admin"
+    assert body["role"] == "admin"
+
+
+def blocking_hash(password):
+    raise AssertionError("hashed while holding a threadpool thread")
+
+
+def fake_hash(password):
+    return f"hashed:{password}"
+
+
+def test_create_and_update_hash_without_blocking(
+    client, db, admin_headers, monkeypatch
+):
+    monkeypatch.setattr(password_hasher, "workers", 0)
+    monkeypatch.setattr(password_hasher, "hash", blocking_hash)
+    monkeypatch.setattr(security, "get_password_hash", fake_hash)
+
+    response = client.post(
+        "/api/v1/users/users/",
+        json={"email": "cook@example.com", "username": "cook", "password": "first"},
+    )
+    assert response.status_code == 200
+    user_id = response.json()["id"]
+    user = db.get(models.User, user_id)
+    assert user.hashed_password == "hashed:first"
+
+    response = client.put(
+        f"/api/v1/users/users/{user_id}",
+        headers=admin_headers,
+        json={"password": "second"},
+    )
+    assert response.status_code == 200
+    db.refresh(user)
+    assert user.hashed_password == "hashed:second"
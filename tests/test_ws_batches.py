@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from app.api.websockets import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, message):
+        self.messages.append(json.loads(message))
+
+    async def close(self, code=1000):
+        pass
+
+
+def received(batched):
+    async def run():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "tablet", "chef", batched=batched)
+        manager.batcher.add_inventory(
+            1, {"ingredient_id": 1, "ingredient_name": "Rice", "quantity": 5.0}
+        )
+        manager.batcher.add_inventory(
+            2, {"ingredient_id": 2, "ingredient_name": "Salt", "quantity": 1.0}
+        )
+        await manager.batcher.flush()
+        await asyncio.sleep(0.01)
+        await manager.close_all()
+        return [message for message in websocket.messages if message["type"] != "hello"]
+
+    return asyncio.run(run())
+
+
+def test_batch_clients_get_one_frame():
+    (message,) = received(batched=True)
+    assert message["type"] == "inventory_batch"
+    assert [item["ingredient_id"] for item in message["data"]["items"]] == [1, 2]
+
+
+def test_other_clients_get_one_message_per_ingredient():
+    messages = received(batched=False)
+    assert [message["type"] for message in messages] == ["inventory_update"] * 2
+    assert [message["data"]["ingredient_id"] for message in messages] == [1, 2]
+    assert messages[0]["data"]["quantity"] == 5.0
+    assert "timestamp" in messages[0]["data"]
@@ -0,0 +1,77 @@
+import asyncio
+
+from sqlalchemy.exc import OperationalError
+
+from app.api import ws_event_log
+from app.api.ws_event_log import EventLog
+
+
+def append_all(log, seqs):
+    for seq in seqs:
+        log.append({"kind": "message", "payload": {}}, lambda seq: None, seq)
+
+
+def store_all(log, count):
+    """Append new events to a persisted log and return their seqs once sent"""
+    sent = []
+
+    async def run():
+        for i in range(count):
+            log.append({"kind": "message", "payload": {"n": i}}, sent.append)
+        await log.stop()
+
+    asyncio.run(run())
+    return sent
+
+
+def test_buffer_stays_sorted_when_events_arrive_out_of_order():
+    log = EventLog(size=3)
+    append_all(log, [2, 1, 4, 3, 5])
+    assert [entry["seq"] for entry in log.entries] == [3, 4, 5]
+
+
+def test_since_replays_out_of_order_events():
+    log = EventLog(size=10)
+    append_all(log, [3, 1, 2, 5, 4])
+    missed = asyncio.run(log.since(1, limit=10))
+    assert [entry["seq"] for entry in missed] == [2, 3, 4, 5]
+
+
+def test_since_needs_a_snapshot_when_the_gap_was_dropped():
+    log = EventLog(size=3)
+    append_all(log, [5, 1, 2, 3, 4])
+    assert asyncio.run(log.since(1, limit=10)) is None
+    assert log.snapshots == 1
+
+
+def test_persisted_events_are_stored_in_one_insert(db, monkeypatch):
+    log = EventLog(size=10, persist=True)
+    inserts = []
+    store = log._store
+
+    async def counting_store(entries):
+        inserts.append(len(entries))
+        return await store(entries)
+
+    monkeypatch.setattr(log, "_store", counting_store)
+    sent = store_all(log, 5)
+    assert inserts == [5]
+    assert sent == sorted(sent) and len(set(sent)) == 5
+    assert [entry["seq"] for entry in log.entries] == sent
+    assert log.last_seq == sent[-1]
+
+
+def test_failed_inserts_are_retried_then_sent_without_seq(monkeypatch):
+    log = EventLog(size=10, persist=True)
+    attempts = []
+
+    async def failing_store(entries):
+        attempts.append(len(entries))
+        raise OperationalError("INSERT", {}, Exception("database is down"))
+
+    monkeypatch.setattr(log, "_store", failing_store)
+    monkeypatch.setattr(ws_event_log, "PERSIST_RETRY_DELAY", 0)
+    assert store_all(log, 3) == [None, None, None]
+    assert attempts == [3] * (ws_event_log.PERSIST_RETRIES + 1)
+    assert log.unsequenced == 3
+    assert not log.entries
@@ -0,0 +1,62 @@
+import asyncio
+
+from app.api.websockets import ConnectionManager
+from app.core.config import settings
+
+
+class SlowHandshakeWebSocket:
+    def __init__(self):
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        await asyncio.sleep(0.01)
+
+    async def send_text(self, message):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+
+def test_concurrent_handshakes_respect_the_ip_cap(monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONNECTIONS_PER_IP", 2)
+
+    async def run():
+        manager = ConnectionManager()
+        sockets = [SlowHandshakeWebSocket() for _ in range(5)]
+        connections = await asyncio.gather(
+            *(
+                manager.connect(websocket, str(i), "chef", ip="10.0.0.1")
+                for i, websocket in enumerate(sockets)
+            )
+        )
+        accepted = len(manager.connections)
+        await manager.close_all()
+        return connections, sockets, accepted
+
+    connections, sockets, accepted = asyncio.run(run())
+    assert accepted == 2
+    assert sum(connection is not None for connection in connections) == 2
+    assert [websocket.close_code for websocket in sockets].count(1008) == 3
+
+
+def test_failed_handshake_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONNECTIONS_PER_IP", 1)
+
+    class BrokenWebSocket(SlowHandshakeWebSocket):
+        async def accept(self, subprotocol=None):
+            raise ConnectionResetError
+
+    async def run():
+        manager = ConnectionManager()
+        try:
+            await manager.connect(BrokenWebSocket(), "a", "chef", ip="10.0.0.1")
+        except ConnectionResetError:
+            pass
+        connection = await manager.connect(
+            SlowHandshakeWebSocket(), "b", "chef", ip="10.0.0.1"
+        )
+        await manager.close_all()
+        return connection
+
+    assert asyncio.run(run()) is not None